@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 请求分发吞吐基准：旧的 catch-all handle()（parse_qs + 彩色 print + if/elif 链）对比按路由注册的处理函数
+# 两种分发方式都通过本机回环跑真实 HTTP 请求，统计 /heartbeat 的每秒请求数
+# 用法: python bench/bench_dispatch.py [请求数] [并发数]
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())   # server 启动时会在当前目录创建数据文件
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+import server
+
+LEGACY_PATHS = ['/api/status', '/', '/line_plot.png', '/user_pie.png', '/speed_chart.png', '/speedtest_now',
+                '/server', '/gg', '/rs', '/admin/admin']
+
+
+async def legacy_handle(request):
+    # 复刻旧分发：每个请求都解析查询串、打印日志，再逐个比较路径
+    path = request.path
+    query_params = parse_qs(request.query_string)
+    client_ip = request.transport.get_extra_info('peername')[0]
+    print(f"\033[94m[请求] {client_ip} - {path}\033[0m")
+    for p in LEGACY_PATHS:
+        if path == p:
+            return web.Response(text='', content_type='text/html')
+    if path == '/heartbeat':
+        client_id = query_params.get('ip', ['unknown'])[0]
+        user, pwd = query_params.get('user', [''])[0], query_params.get('pwd', [''])[0]
+        online = server.register_heartbeat(client_id, user, pwd, query_params.get('pt', [''])[0])
+        server.devices.add(client_id)
+        return web.Response(text=f"<html><head><title>Heartbeat</title></head><body><h1>Heartbeat Received</h1><p>ip: {client_id}</p><p>user: {user}</p><p>pwd: {pwd}</p><p>%%{online}%%</p></body></html>", content_type='text/html')
+    return web.Response(text='404', status=404)
+
+
+def legacy_app():
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', legacy_handle)
+    app.router.add_post('/{tail:.*}', legacy_handle)
+    return app
+
+
+async def run(app, total, concurrency):
+    async with TestClient(TestServer(app)) as client:
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with sem:
+                r = await client.get('/heartbeat', params={'ip': f"10.0.{i >> 8 & 255}.{i & 255}",
+                                                          'user': f"user{i % 50}", 'pwd': 'x', 'pt': 'pc'})
+                await r.read()
+
+        await asyncio.gather(*(one(i) for i in range(200)))   # 预热
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return total / (time.perf_counter() - t0)
+
+
+async def main(total, concurrency):
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy = await run(legacy_app(), total, concurrency)
+    routed = await run(server.create_app(), total, concurrency)
+    print(f"legacy catch-all : {legacy:8.0f} req/s")
+    print(f"routed handlers  : {routed:8.0f} req/s  ({routed / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(total, concurrency))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 心跳处理微基准：在线客户端从 100 增长到 10 万，单次心跳（登记 + 同账号在线数）的耗时应保持平稳
+# 用法: python bench/bench_heartbeat.py
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())   # server 启动时会在当前目录创建数据文件
+import server
+
+SIZES = [100, 1000, 10000, 100000]
+USERS = 500       # 账号数，多台设备共用一个账号
+ROUNDS = 20000
+
+
+def legacy_count(nested_dict, specific_user):
+    # 旧实现：每次心跳遍历全部客户端
+    return [v.get('user') for v in nested_dict.values()].count(specific_user)
+
+
+def fill(n):
+    # 旧实现的在线表是 ip -> dict，另建一份同样内容的 dict 表给 legacy 用
+    server.clients.clear(); server.user_sessions.clear()
+    table = {}
+    for i in range(n):
+        ip, user = f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", f"user{i % USERS}"
+        server.register_heartbeat(ip, user, "", "pc")
+        table[ip] = {'timestamp': time.time(), 'user': user, 'pwd': "", 'pt': "pc"}
+    return table
+
+
+def bench_new(n):
+    t0 = time.perf_counter()
+    for i in range(ROUNDS):
+        j = i % n
+        server.register_heartbeat(f"10.{j >> 16 & 255}.{j >> 8 & 255}.{j & 255}", f"user{j % USERS}", "", "pc")
+    return (time.perf_counter() - t0) / ROUNDS
+
+
+def bench_legacy(table, n):
+    rounds = max(10, ROUNDS // max(1, n // 100))
+    t0 = time.perf_counter()
+    for i in range(rounds):
+        legacy_count(table, f"user{i % USERS}")
+    return (time.perf_counter() - t0) / rounds
+
+
+if __name__ == "__main__":
+    print(f"{'clients':>8}  {'new(us)':>9}  {'legacy(us)':>11}")
+    for n in SIZES:
+        table = fill(n)
+        print(f"{n:>8}  {bench_new(n) * 1e6:>9.2f}  {bench_legacy(table, n) * 1e6:>11.1f}")
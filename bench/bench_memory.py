@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 在线表内存基准：旧的每客户端 dict 与 __slots__ 会话记录，比较每个在线客户端占用的字节数
+# 每次心跳的查询参数都是新解析出来的字符串对象，这里用 str 拼接模拟
+# 用法: python bench/bench_memory.py [客户端数]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())   # server 启动时会在当前目录创建数据文件
+import server
+
+USERS = 500
+
+
+def fresh(s):
+    return (s + '.')[:-1]
+
+
+def heartbeats(n):
+    for i in range(n):
+        yield (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", fresh(f"user{i % USERS}"),
+               fresh(f"pwd{i % USERS}"), fresh("pc"))
+
+
+def legacy(n):
+    table = {}
+    for ip, user, pwd, pt in heartbeats(n):
+        table[ip] = {'timestamp': time.time(), 'user': user, 'pwd': pwd, 'pt': pt}
+    return table
+
+
+def slotted(n):
+    server.clients.clear(); server.user_sessions.clear()
+    for ip, user, pwd, pt in heartbeats(n):
+        server.register_heartbeat(ip, user, pwd, pt)
+    return server.clients
+
+
+def measure(fill, n):
+    tracemalloc.start()
+    keep = fill(n)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return used / n
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    old = measure(legacy, n)
+    new = measure(slotted, n)
+    print(f"clients: {n}")
+    print(f"dict per client    : {old:7.1f} bytes")
+    print(f"slotted per client : {new:7.1f} bytes  (含账号索引, {new / old:.0%})")
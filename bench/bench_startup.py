@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 冷启动基准：从启动 server.py 进程开始计时，到第一个 /heartbeat 请求得到应答为止（time-to-first-heartbeat）
+# 每轮在新的临时目录中启动，不带历史数据；传入数据目录时先把其中的 count.yml 等文件复制过去，模拟真实部署
+# 用法: python bench/bench_startup.py [轮数] [数据目录]
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server.py')
+DATA_FILES = ['count.yml', 'user_count_log.json', 'feedback.txt', 'speedlog.bin', 'speedlog.csv']
+TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def first_heartbeat(data_dir):
+    cwd = tempfile.mkdtemp()
+    if data_dir:
+        for name in DATA_FILES:
+            if os.path.exists(os.path.join(data_dir, name)): shutil.copy(os.path.join(data_dir, name), cwd)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/heartbeat?ip=10.0.0.1&user=bench&pwd=x&pt=pc"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, SERVER, '--port', str(port)], cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < TIMEOUT:
+            if proc.poll() is not None: raise RuntimeError(f"server.py 退出，返回码 {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as r:
+                    if r.status == 200: return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("等待心跳应答超时")
+    finally:
+        proc.terminate(); proc.wait()
+        shutil.rmtree(cwd, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    data_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    times = [first_heartbeat(data_dir) for _ in range(rounds)]
+    print(f"rounds: {rounds}")
+    print(f"time-to-first-heartbeat  min {min(times) * 1000:7.1f} ms  median {statistics.median(times) * 1000:7.1f} ms")
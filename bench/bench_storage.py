@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 存储基准：文件存储与 sqlite 存储，比较写入、冷启动全量读取在线人数、按时间窗口查询测速、会话快照的耗时
+# 全部在临时目录中完成，不需要启动服务端
+# 用法: python bench/bench_storage.py [小时记录数] [在线会话数]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import FileStore, SqliteStore
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - t0) * 1000, result
+
+
+def run(make, hours, sessions):
+    store = make()
+    store.open()
+    now = time.time()
+    counts = [(now - 3600 * (hours - i), i % 300) for i in range(hours)]
+    speeds = [(ts, 20.0, 90.0, 40.0) for ts, _ in counts]
+    rows = [(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", now, f"user{i % 500}", 'pc') for i in range(sessions)]
+    t_write = timed(lambda: [store.add_count(ts, n) for ts, n in counts[:200]])[0] / 200
+    for ts, n in counts[200:]: store.add_count(ts, n)
+    store.speed.extend(speeds)
+    t_read, (_, got, _) = timed(store.read_counts, None)
+    t_window, window = timed(store.speed.window, now - 12 * 3600)
+    t_save = timed(store.save_sessions, 0, rows)[0]
+    t_load, loaded = timed(store.load_sessions)
+    store.close()
+    assert len(got) == hours and len(window[0]) == 12 and len(loaded) == sessions
+    return t_write, t_read, t_window, t_save, t_load
+
+
+if __name__ == "__main__":
+    hours = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    os.chdir(tempfile.mkdtemp())
+    backends = {
+        'file':   lambda: FileStore('count.yml', 'user_count_log.json', 'speedlog.bin', 'sessions.json'),
+        'sqlite': lambda: SqliteStore('drcom.db'),
+    }
+    print(f"hour records: {hours}, sessions: {sessions}")
+    print(f"{'backend':8} {'add_count':>10} {'read all':>10} {'12h speed':>10} {'save sess':>10} {'load sess':>10}  (ms)")
+    for name, make in backends.items():
+        print(f"{name:8} " + " ".join(f"{t:10.3f}" for t in run(make, hours, sessions)))
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# 图表渲染：由 server.py 放到独立进程池中执行，只使用面向对象的 Figure 接口，不依赖 pyplot 的全局状态
+from datetime import datetime, timezone
+from io import BytesIO
+
+
+def init_worker():
+    """渲染进程初始化：设置字体，提前加载 matplotlib"""
+    import matplotlib
+    matplotlib.use('Agg')
+    matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+
+
+def _figure(figsize):
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize)
+
+
+def _png(fig, **kwargs):
+    buf = BytesIO()
+    fig.savefig(buf, format='png', **kwargs)
+    return buf.getvalue()
+
+
+def render_message(text, figsize=(10, 4), dpi=80):
+    fig = _figure(figsize)
+    ax = fig.subplots()
+    ax.text(0.5, 0.5, text, ha='center'); ax.axis('off')
+    return _png(fig, dpi=dpi)
+
+
+def render_line_plot(resolution, starts, mins, maxs, avgs):
+    # starts 为各时间桶的起始 epoch 秒；点少时画标记，汇总桶额外画出最小~最大范围
+    ts = [datetime.fromtimestamp(t) for t in starts]
+    fig = _figure((10, 5))
+    ax = fig.subplots()
+    if resolution != 'hour':
+        ax.fill_between(ts, mins, maxs, color='b', alpha=0.15, label='min~max')
+    ax.plot(ts, avgs, marker='o' if len(ts) <= 60 else None, linestyle='-', color='b', label='用户数量')
+    ax.set_title(f'user/time ({resolution})'); ax.set_xlabel('time'); ax.set_ylabel('user')
+    ax.legend(); ax.grid(True); fig.tight_layout()
+    return _png(fig, dpi=80)
+
+
+def render_user_pie(counts):
+    if not counts:
+        return render_message('None', figsize=(4, 4))
+    labels, sizes = zip(*counts.items())
+    fig = _figure((5, 5))
+    ax = fig.subplots()
+    ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, shadow=True)
+    ax.set_title('user'); ax.axis('equal')
+    return _png(fig, dpi=80)
+
+
+def render_speed_chart(times, pings, downs, ups):
+    # times 为 epoch 秒，按 UTC 显示
+    from matplotlib.dates import DateFormatter
+    times = [datetime.fromtimestamp(t, timezone.utc).replace(tzinfo=None) for t in times]
+    fig = _figure((10, 4))
+    ax = fig.subplots()
+    if downs: ax.plot(times, downs, label='download (Mbps)', color='#2E8B57', linewidth=1.5)
+    if ups:   ax.plot(times, ups,   label='upload (Mbps)',   color='#1F77B4', linewidth=1.5)
+    if pings: ax.plot(times, pings, label='ping (ms)',       color='#FF6F00', linewidth=1.2, alpha=0.8)
+    ax.set_ylabel('speed / ping'); ax.set_xlabel('time (UTC)'); ax.grid(True, alpha=0.2); ax.legend(loc='upper left', fontsize=9)
+    ax.xaxis.set_major_formatter(DateFormatter('%H:%M'))
+    ax.tick_params(axis='x', labelrotation=30, labelsize=8); fig.tight_layout()
+    return _png(fig, dpi=80, bbox_inches='tight')
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 客户端核心：校园网状态检测、掉线重新登录、服务器心跳，不依赖 tkinter
+# clent-online.py / client-offline.py 只是它的界面（共用 client_tk.py）；没有显示器的设备可直接运行:
+#   python client_core.py [--user 账号 --pwd 密码] [--server IP] [--offline] [--debug]
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+last_ad_update = 0
+AD_REFRESH_INTERVAL = 10
+
+# 配置文件
+VERSION_FN = 'version.yml'
+
+
+def _version(path):
+    return open(path, encoding='utf-8').read().strip()
+
+
+# 服务器配置
+SER_IP = ""
+SER_UDP_PORT = 0       # 服务端 UDP 心跳端口，0 为只用 HTTP
+UDP_TIMEOUT = 0.5      # UDP 心跳等待应答的时间(秒)，超时改用 HTTP
+UDP_RETRY_INTERVAL = 60   # UDP 无应答后，隔多久(秒)再尝试 UDP
+PORTAL_TIMEOUT = 5     # 校园网状态检测/重新登录超时(秒)
+SERVER_TIMEOUT = 5     # 服务器心跳超时(秒)
+TIP_TIMEOUT = 5        # 小贴士/版本获取超时(秒)
+VER = ""
+CFG = "comfig.yml"
+debug = False
+
+# 网络配置
+url_chk = ""    # 网络状态检查URL
+url_login = ""  # 登录认证URL
+
+# 日志
+LOG_FILE = "client.log"       # 本地日志文件
+LOG_MAX_BYTES = 1 << 20       # 日志文件轮转大小
+LOG_BACKUPS = 3               # 保留的旧日志文件个数
+
+
+# ---------- 日志 ----------
+class Log:
+    # 每行写入 LOG_FILE(按大小轮转)，再转给 sinks 里的前端(界面日志框、控制台)
+    def __init__(self):
+        self.sinks = []
+        self.file = None
+
+    def _open(self):
+        self.file = logging.getLogger("client")
+        self.file.setLevel(logging.INFO)
+        self.file.propagate = False
+        if not self.file.handlers:
+            try:
+                handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(asctime)s  %(message)s"))
+                self.file.addHandler(handler)
+            except OSError:
+                pass
+
+    def write(self, s):
+        s = s.strip()
+        if not s: return
+        if self.file is None: self._open()
+        self.file.info(s)
+        line = f"{time.strftime('%m-%d %H:%M:%S')}  {s}"
+        for sink in self.sinks:
+            sink(line)
+
+    def flush(self): pass
+
+
+log = Log()
+
+
+# ---------- 账号 ----------
+def load_account():
+    """读取本地账号，返回 [账号, 密码]；文件损坏时删除并返回 None"""
+    if not os.path.exists(CFG):
+        return None
+    try:
+        with open(CFG, "rb") as f:
+            account = base64.b64decode(f.read()).decode().split(",")
+        return account if len(account) == 2 else None
+    except Exception:
+        os.remove(CFG)
+        return None
+
+
+def save_account(user, pwd):
+    with open(CFG, "wb") as f:
+        f.write(base64.b64encode(f"{user},{pwd}".encode()))
+
+
+def delete_account():
+    try:
+        os.remove(CFG)
+        return True
+    except OSError:
+        return False
+
+
+# ---------- 连接池 ----------
+# 所有请求共用一个 Session，长连接复用，稳定运行时每个服务器只保持一条连接
+# requests 在第一次发请求时才导入，导入本模块和启动守护进程都不必等它
+POOL_SIZE = 4             # 每个主机保留的空闲连接数
+CONN_STATS_INTERVAL = 300  # 连接复用统计写入日志的间隔(秒)
+_http = None
+_adapter = None
+
+
+def http():
+    global _http, _adapter
+    if _http is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        _adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+        _http = requests.Session()
+        _http.mount("http://", _adapter)
+        _http.mount("https://", _adapter)
+    return _http
+
+
+def conn_stats():
+    """连接复用统计：各主机连接池累计的请求数与新建连接数"""
+    reqs = conns = 0
+    pools = _adapter.poolmanager.pools if _adapter else {}
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None: continue
+        reqs += pool.num_requests; conns += pool.num_connections
+    reuse = (1 - conns / reqs) * 100 if reqs else 0
+    return f"连接复用：请求 {reqs} 次，新建连接 {conns} 次，复用率 {reuse:.1f}%"
+
+
+def post_feedback(content):
+    """提交反馈，返回是否成功；未配置服务器时返回 None"""
+    if not SER_IP: return None
+    return http().post(f"http://{SER_IP}:80/feedback", data={"feedback": content}, timeout=10).status_code == 200
+
+
+# ---------- 心跳调度 ----------
+# 自适应间隔：掉线后按最短间隔快速轮询；连续正常则间隔逐步翻倍，直到上限；
+# 出错时从当前间隔开始指数退避并随机抖动，不会比出错前更频繁，避免服务端重启后所有客户端同时重连
+# 稳定间隔加上抖动和一次心跳的最长耗时，必须小于服务端的 CLIENT_TIMEOUT，否则在线的客户端会被判为离线
+SERVER_CLIENT_TIMEOUT = 20   # 服务端 CLIENT_TIMEOUT(秒)，两边需保持一致
+POLL_JITTER = 0.1      # 正常间隔的随机抖动比例
+POLL_FAST = 1          # 最短轮询间隔(秒)
+POLL_CEILING = (SERVER_CLIENT_TIMEOUT - UDP_TIMEOUT - SERVER_TIMEOUT - 1) / (1 + POLL_JITTER)   # 稳定时的最长轮询间隔(秒)
+BACKOFF_MAX = 120      # 出错退避的最长间隔(秒)
+PORTAL_BACKOFF_MAX = 5   # 校园网检测出错时的最长间隔(秒)：超时多半是刚掉线，要尽快重试重新登录
+
+
+class Pacer:
+    def __init__(self, name, fast=POLL_FAST, ceiling=POLL_CEILING, backoff_max=BACKOFF_MAX):
+        self.name = name
+        self.fast, self.ceiling, self.backoff_max = fast, ceiling, backoff_max
+        self.interval = fast
+        self.errors = 0
+        self.base = fast       # 开始退避时的间隔
+        self.mode = "fast"
+
+    def _set(self, mode, interval, note=""):
+        if mode != self.mode or note:
+            log.write(f"[调度] {self.name}: {mode}，间隔 {interval:.1f}s{note}")
+        self.mode, self.interval = mode, interval
+
+    def ok(self):
+        """本轮正常：间隔翻倍直到上限；刚从退避恢复时先回到最短间隔"""
+        interval = self.fast if self.errors else min(self.interval * 2, self.ceiling)
+        self.errors = 0
+        self._set("stable" if interval >= self.ceiling else "relax", interval)
+
+    def drop(self):
+        """检测到掉线：回到最短间隔快速轮询"""
+        self.errors = 0
+        self._set("fast", self.fast)
+
+    def error(self):
+        """请求出错：从出错前的间隔开始指数退避，在 [出错前间隔, 退避上限] 内随机抖动"""
+        if not self.errors: self.base = min(max(self.interval, self.fast), self.backoff_max)
+        self.errors += 1
+        cap = min(self.backoff_max, self.base * 2 ** self.errors)
+        self._set("backoff", random.uniform(self.base, cap), f"（连续失败 {self.errors} 次）")
+
+    def delay(self):
+        # 退避间隔本身已随机；正常间隔加 ±POLL_JITTER 抖动，让各客户端的请求逐渐错开
+        return self.interval if self.mode == "backoff" else self.interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+
+# ---------- 链路监视 ----------
+# Linux 下订阅 netlink 的网卡、地址、路由变化，链路一有变动就唤醒校园网检测，立即检查并重新登录；
+# 没有 netlink 时退而轮询 /proc/net/route 的默认网关；两者都不可用(如 Windows)时只靠定时检测
+# 链路监视生效后，定时检测只作兜底，稳定时的间隔放宽到 LINK_POLL_CEILING
+LINK_MONITOR = True        # 是否启用链路监视
+LINK_POLL_CEILING = 60     # 链路监视生效时，校园网检测稳定后的最长间隔(秒)
+ROUTE_POLL_INTERVAL = 2    # 无 netlink 时轮询默认网关的间隔(秒)
+NETLINK_GROUPS = 0x1 | 0x10 | 0x40 | 0x100 | 0x400   # RTMGRP_LINK | IPV4_IFADDR | IPV4_ROUTE | IPV6_IFADDR | IPV6_ROUTE
+
+
+def default_gateway():
+    """读取 /proc/net/route 中的默认路由，返回 (网卡, 网关) 或 None"""
+    try:
+        with open("/proc/net/route") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if len(fields) > 3 and fields[1] == "00000000" and int(fields[3], 16) & 0x2:
+                    gw = bytes.fromhex(fields[2])[::-1]
+                    return fields[0], socket.inet_ntoa(gw)
+    except (OSError, ValueError, StopIteration):
+        pass
+    return None
+
+
+class LinkMonitor:
+    def __init__(self, wake):
+        self.wake = wake          # asyncio.Event，链路变化时置位
+        self.active = False
+        self.gateway = default_gateway()
+
+    def _changed(self, why):
+        gateway = default_gateway()
+        if gateway != self.gateway:
+            log.write(f"[链路] 默认网关变化：{self.gateway} -> {gateway}")
+            self.gateway = gateway
+        elif why:
+            log.write(f"[链路] {why}")
+        self.wake.set()
+
+    def _on_netlink(self, sock):
+        n = 0
+        try:
+            while True:
+                sock.recv(65536); n += 1   # 一次变化往往连着多条消息，读空后只唤醒一次
+        except (BlockingIOError, InterruptedError):
+            pass
+        if n: self._changed(f"网卡/路由变化 {n} 条")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.setblocking(False)
+            sock.bind((0, NETLINK_GROUPS))
+            loop.add_reader(sock.fileno(), self._on_netlink, sock)
+        except (AttributeError, OSError, NotImplementedError):
+            sock = None
+        if sock is not None:
+            self.active = True
+            log.write("链路监视：netlink")
+            try:
+                await loop.create_future()
+            finally:
+                loop.remove_reader(sock.fileno()); sock.close()
+        elif os.path.exists("/proc/net/route"):
+            self.active = True
+            log.write("链路监视：轮询默认网关")
+            while True:
+                await asyncio.sleep(ROUTE_POLL_INTERVAL)
+                if default_gateway() != self.gateway: self._changed("")
+        else:
+            log.write("链路监视不可用，仅定时检测")
+
+
+# ---------- 心跳应答 ----------
+def udp_heartbeat(ip, user, pwd, pt):
+    """UDP 心跳，返回 (在线人数, 小贴士哈希, 版本哈希)；无应答返回 None"""
+    payload = b'HB\x02' + b''.join(bytes([len(b)]) + b for b in (f.encode()[:255] for f in (ip, user, pwd, pt)))
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.settimeout(UDP_TIMEOUT)
+        try:
+            s.sendto(payload, (SER_IP, SER_UDP_PORT))
+            data = s.recv(64)
+        except OSError:
+            return None
+    if len(data) >= 13 and data[:3] == b'HB\x02':
+        n, tip, ver = struct.unpack('!HII', data[3:13])
+        return n, f"{tip:08x}", f"{ver:08x}"
+    return None
+
+
+def parse_heartbeat(hb):
+    """解析 HTTP 心跳应答，返回 (在线人数, 小贴士哈希, 版本哈希)；旧版服务端只返回 HTML，哈希为 None"""
+    if hb.headers.get("Content-Type", "").startswith("application/json"):
+        d = hb.json()
+        return int(d["n"]), d.get("tip"), d.get("ver")
+    return int(hb.text.split('%%')[1]), None, None
+
+
+async def call(func, *args, timeout, **kwargs):
+    """在线程中执行阻塞请求，并单独设置超时"""
+    return await asyncio.wait_for(asyncio.to_thread(func, *args, timeout=timeout, **kwargs), timeout + 1)
+
+
+# ---------- 状态输出 ----------
+class LogView:
+    # 无界面运行时的状态输出：状态文字变化时写一行日志，颜色忽略
+    def __init__(self):
+        self.shown = {}
+
+    def _show(self, name, text):
+        if self.shown.get(name) != text:
+            self.shown[name] = text
+            log.write(f"[{name}] {text}")
+
+    def set_status(self, text, color): self._show("状态", text)
+
+    def set_online(self, text, color): self._show("在线", text)
+
+    def set_ad(self, text): pass
+
+    def set_ver(self, text, color): self._show("版本", text)
+
+
+# ---------- 认证引擎 ----------
+# asyncio 引擎：校园网状态检测、服务器心跳、小贴士刷新三个任务并发运行，各自超时，互不拖慢
+# 状态通过 view 的 set_status/set_online/set_ad/set_ver 输出；offline 时只做校园网检测
+class Engine:
+    def __init__(self, account, view=None, offline=False):
+        self.account = account
+        self.view = view or LogView()
+        self.offline = offline
+        self.running = False
+        self.loop = None
+        self.task = None
+        self.new_ver = ""
+
+    async def portal_loop(self, state):
+        view = self.view
+        pacer = Pacer("校园网", backoff_max=PORTAL_BACKOFF_MAX)
+        monitor = state["monitor"]
+        while self.running:
+            pacer.ceiling = LINK_POLL_CEILING if monitor and monitor.active else POLL_CEILING
+            try:
+                if debug == True:
+                    view.set_status("网络连接正常（debug）", "lightgreen")
+                    state["ip"] = "127.0.0.1"
+                    pacer.ok()
+                elif url_chk and url_login:
+                    r = await call(http().get, url_chk, timeout=PORTAL_TIMEOUT)
+                    data = json.loads(r.text[r.text.index("(") + 1: r.text.rindex(")")])
+                    result, state["ip"] = data.get("result"), data.get("v46ip", "")
+                    if result == 1:
+                        view.set_status("网络连接正常", "lightgreen")
+                        pacer.ok()
+                    else:
+                        view.set_status("已掉线，正在重连", "orange")
+                        pacer.drop()
+                        await call(http().get, url_login, timeout=PORTAL_TIMEOUT)
+                else:
+                    view.set_status("网络配置未设置", "orange")
+                    state["ip"] = ""
+                    pacer.ok()
+            except asyncio.TimeoutError:
+                view.set_status("请求超时", "red")
+                pacer.error()
+            except Exception as e:
+                view.set_status("请求异常", "red")
+                log.write(str(e))
+                pacer.error()
+            # 等到下一次定时检测，链路变化时提前醒来并回到快速轮询
+            try:
+                await asyncio.wait_for(state["wake"].wait(), pacer.delay())
+            except asyncio.TimeoutError:
+                pass
+            if state["wake"].is_set():
+                state["wake"].clear()
+                pacer.drop()
+
+    async def server_loop(self, state):
+        view = self.view
+        user, pwd = self.account
+        udp_retry_at = 0
+        pacer = Pacer("服务器")
+        while self.running:
+            ip = state["ip"]
+            if SER_IP and ip:
+                try:
+                    reply = None
+                    if SER_UDP_PORT and time.time() >= udp_retry_at:
+                        reply = await asyncio.to_thread(udp_heartbeat, ip, user, pwd, "pc")
+                        if reply is None:
+                            udp_retry_at = time.time() + UDP_RETRY_INTERVAL
+                            log.write("UDP 心跳无应答，改用 HTTP")
+                    if reply is None:
+                        hb = await call(http().get, f"http://{SER_IP}:80/heartbeat",
+                                        params={"ip": ip, "user": user, "pwd": pwd, "pt": "pc", "v": "2"},
+                                        headers={"Accept": "application/json"}, timeout=SERVER_TIMEOUT)
+                        reply = parse_heartbeat(hb)
+                    n, state["tip"], state["ver"] = reply
+                    view.set_online(f"当前账号共在线 {n} 人", "lightgreen" if n <= 5 else "red")
+                    pacer.ok()
+                except Exception:
+                    view.set_online("无法获取在线人数", "orange")
+                    pacer.error()
+            else:
+                # 没有校园网 IP 时等待掉线检测恢复，保持快速轮询
+                view.set_online("无法获取在线人数", "orange")
+                pacer.drop()
+            await asyncio.sleep(pacer.delay())
+
+    async def tip_loop(self, state):
+        global last_ad_update
+        view = self.view
+        seen_tip = seen_ver = None
+        gg = []
+        last_stats = time.time()
+        while self.running:
+            # 广告：服务端的小贴士哈希变化时才重新获取，旧版服务端仍按间隔获取
+            now = time.time()
+            tip, ver = state["tip"], state["ver"]
+            if SER_IP and (tip != seen_tip if tip else now - last_ad_update >= AD_REFRESH_INTERVAL):
+                try:
+                    gg = (await call(http().get, f"http://{SER_IP}:80/gg", timeout=TIP_TIMEOUT)).text.strip().split('|')
+                    seen_tip = tip
+                except Exception:
+                    pass
+            if gg and now - last_ad_update >= AD_REFRESH_INTERVAL:
+                view.set_ad(f"{random.choice(gg)}")
+                last_ad_update = now
+            # 版本：启动时获取一次，之后版本哈希变化时再获取
+            if SER_IP and (ver != seen_ver if ver else not self.new_ver):
+                try:
+                    self.new_ver = (await call(http().get, f"http://{SER_IP}:80/update", timeout=TIP_TIMEOUT)).text.strip()
+                    seen_ver = ver
+                except Exception:
+                    pass
+            if SER_IP:
+                if self.new_ver == VER:
+                    view.set_ver(f"版本：{VER}", "lightgreen")
+                else:
+                    view.set_ver(f"版本：{VER},最新：{self.new_ver}", "red")
+            else:
+                view.set_ver("版本：未知", "lightgreen")
+            if now - last_stats >= CONN_STATS_INTERVAL:
+                log.write(conn_stats()); last_stats = now
+            await asyncio.sleep(1)
+
+    async def run(self):
+        self.loop, self.task = asyncio.get_running_loop(), asyncio.current_task()
+        wake = asyncio.Event()
+        monitor = LinkMonitor(wake) if LINK_MONITOR else None
+        state = {"ip": "", "tip": None, "ver": None, "wake": wake, "monitor": monitor}
+        tasks = [self.portal_loop(state)]
+        if self.offline:
+            self.view.set_online("离线模式", "orange")
+            self.view.set_ver("版本：未知", "lightgreen")
+        else:
+            tasks += [self.server_loop(state), self.tip_loop(state)]
+        watcher = asyncio.ensure_future(monitor.run()) if monitor else None
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            self.running = False
+            if watcher: watcher.cancel()
+
+    def run_forever(self):
+        """在当前线程运行，直到 stop() 或 Ctrl+C"""
+        self.running = True
+        try:
+            asyncio.run(self.run())
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            pass
+        finally:
+            self.running = False
+
+    def start(self):
+        """在后台线程运行，供界面使用"""
+        if self.running: return False
+        self.running = True
+        threading.Thread(target=self.run_forever, daemon=True).start()
+        return True
+
+    def stop(self):
+        """可在任意线程调用"""
+        self.running = False
+        if self.task is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.task.cancel)   # 取消仍在等待超时的请求，立即停止
+
+
+def main(argv=None):
+    global SER_IP, debug
+    parser = argparse.ArgumentParser(description="网络认证助手（无界面）")
+    parser.add_argument("--user", help="账号，与 --pwd 一起给出时保存到本地")
+    parser.add_argument("--pwd", help="密码")
+    parser.add_argument("--server", help="服务器IP，覆盖 SER_IP")
+    parser.add_argument("--offline", action="store_true", help="离线模式，只做校园网检测和重新登录")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv)
+    if args.server is not None: SER_IP = args.server
+    if args.debug: debug = True
+    if args.user and args.pwd:
+        save_account(args.user, args.pwd)
+    account = load_account()
+    if not account:
+        print("未找到账号，请用 --user 和 --pwd 录入", file=sys.stderr)
+        return 1
+    log.sinks.append(print)
+    log.write(f"后台认证已启动（账号 {account[0]}）")
+    Engine(account, offline=args.offline).run_forever()
+    log.write("后台认证已停止")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
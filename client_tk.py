@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# 客户端 Tk 界面：clent-online.py / client-offline.py 共用的窗口、账号录入、日志框和界面更新队列
+# 认证逻辑都在 client_core.py，入口脚本只给出标题、是否离线和反馈按钮的行为
+import threading
+import tkinter as tk
+from collections import deque
+from tkinter import scrolledtext, messagebox
+
+import client_core as core
+from client_core import log
+
+# 界面配置；服务器、校园网、日志文件等配置见 client_core.py
+LOG_VIEW_LINES = 500          # 日志框最多显示的行数
+LOG_TRIM_BATCH = 100          # 超出多少行后批量删除旧行
+
+
+# ---------- 界面更新队列 ----------
+# 后台线程不直接改 Tk 控件，只登记要显示的值；主循环每 UI_INTERVAL 毫秒取出一次，
+# 同一控件多次更新只保留最后一次，和当前显示相同的值直接跳过，状态不变时界面不重绘
+UI_INTERVAL = 100   # 界面刷新间隔(毫秒)
+
+
+class UiQueue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.shown = {}
+
+    def set(self, widget, **options):
+        with self.lock:
+            self.pending.setdefault(widget, {}).update(options)
+
+    def drain(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for widget, options in pending.items():
+            shown = self.shown.setdefault(widget, {})
+            changed = {k: v for k, v in options.items() if shown.get(k) != v}
+            if changed:
+                widget.config(**changed)
+                shown.update(changed)
+
+
+# ---------- 日志框 ----------
+class LogBox:
+    # 挂在 core.log 上，任意线程写入的日志行先攒在 pending 里，由主循环 drain 一次性插入
+    # pending 是定长环形缓冲，界面来不及刷新时只保留最新的 LOG_VIEW_LINES 行；
+    # 文本框只保留最后 LOG_VIEW_LINES 行，超出 LOG_TRIM_BATCH 行后一次性删掉开头的旧行
+    def __init__(self, widget):
+        self.widget = widget
+        self.lock = threading.Lock()
+        self.pending = deque(maxlen=LOG_VIEW_LINES)
+        self.shown = 0
+
+    def add(self, line):
+        with self.lock:
+            self.pending.append(line + "\n")
+
+    def drain(self):
+        with self.lock:
+            lines = list(self.pending)
+            self.pending.clear()
+        if lines:
+            self.widget.insert("end", "".join(lines))
+            self.shown += len(lines)
+            if self.shown > LOG_VIEW_LINES + LOG_TRIM_BATCH:
+                self.widget.delete("1.0", f"{self.shown - LOG_VIEW_LINES + 1}.0")
+                self.shown = LOG_VIEW_LINES
+            self.widget.see("end")
+
+
+# ---------- UI 刷新 ----------
+class TkView:
+    # 引擎在后台线程调用，只登记到更新队列；离线窗口没有小贴士栏，set_ad 忽略
+    def __init__(self, window):
+        self.window = window
+
+    def set_status(self, text, color):
+        self.window.ui.set(self.window.lbl_status, text=text, bg=color)
+
+    def set_online(self, text, color):
+        self.window.ui.set(self.window.lbl_online, text=text, bg=color)
+
+    def set_ad(self, text):
+        if self.window.lbl_ad is not None: self.window.ui.set(self.window.lbl_ad, text=text)
+
+    def set_ver(self, text, color):
+        self.window.ui.set(self.window.lbl_ver, text=text, bg=color)
+
+
+# ---------- 主界面 ----------
+class ClientWindow:
+    def __init__(self, title, offline=False, on_feedback=None):
+        """on_feedback(root) 为快速反馈按钮的处理函数"""
+        self.offline = offline
+        self.account = []
+        self.engine = None
+        self.ui = UiQueue()
+
+        root = self.root = tk.Tk()
+        root.title(title)
+        root.geometry("700x500")
+
+        # 顶部状态条
+        status_frame = tk.Frame(root)
+        status_frame.pack(fill="x", padx=5, pady=5)
+
+        self.lbl_status = tk.Label(status_frame, text="等待认证", bg="lightblue", font=("微软雅黑", 12))
+        self.lbl_status.pack(side="left", fill="x", expand=True)
+
+        self.lbl_online = tk.Label(status_frame, text="在线：--", bg="lightblue", font=("微软雅黑", 12))
+        self.lbl_online.pack(side="left", padx=10)
+
+        self.lbl_usr = tk.Label(status_frame, text="用户信息：--", bg="lightblue", font=("微软雅黑", 12))
+        self.lbl_usr.pack(side="left", padx=10)
+
+        # 日志区
+        log_box = scrolledtext.ScrolledText(root, height=12, state='normal')
+        log_box.pack(fill="both", expand=True, padx=5, pady=5)
+        self.box = LogBox(log_box)
+        log.sinks.append(self.box.add)
+
+        # 底部信息；离线时没有小贴士
+        self.lbl_ad = None
+        if not offline:
+            self.lbl_ad = tk.Label(root, text="--", bg="lightblue", font=("微软雅黑", 11))
+            self.lbl_ad.pack(fill="x", padx=5, pady=2)
+            tk.Label(root, text="", bg="lightgreen", font=("微软雅黑", 11)).pack(fill="x", padx=5, pady=2)
+
+        self.lbl_ver = tk.Label(root, text="版本：未知", bg="lightgreen", font=("微软雅黑", 11))
+        self.lbl_ver.pack(fill="x", padx=5, pady=2)
+
+        tk.Label(root, text="本程序用于网络自动认证\n本程序仅供个人学习和参考，请勿用做其他用途",
+                 bg="lightblue", font=("微软雅黑", 11)).pack(fill="x", padx=5, pady=2)
+
+        # 按钮
+        btn_frame = tk.Frame(root)
+        btn_frame.pack(pady=5)
+        tk.Button(btn_frame, text="开始认证", bg="green", command=self.start_auth, width=12).grid(row=0, column=0, padx=5)
+        tk.Button(btn_frame, text="停止登录", bg="red", command=self.stop_auth, width=12).grid(row=0, column=1, padx=5)
+        tk.Button(btn_frame, text="重新录入", command=self.write_account, width=12).grid(row=0, column=2, padx=5)
+        tk.Button(btn_frame, text="删除账号", command=self.delete_account, width=12).grid(row=0, column=3, padx=5)
+        tk.Button(btn_frame, text="快速反馈", command=lambda: on_feedback(root), width=12).grid(row=0, column=4, padx=5)
+        tk.Button(btn_frame, text="退出", command=root.destroy, width=12).grid(row=0, column=5, padx=5)
+
+    # ---------- 账号 ----------
+    def load_account(self):
+        self.account = core.load_account() or []
+        if self.account:
+            self.lbl_usr["text"] = f"用户名: {self.account[0]} \n密码: {self.account[1]}"
+            self.lbl_usr["bg"] = "lightgreen"
+        return bool(self.account)
+
+    def write_account(self):
+        def save():
+            user, pwd = e1.get().strip(), e2.get().strip()
+            if not user or not pwd: messagebox.showerror("错误", "不能为空"); return
+            core.save_account(user, pwd)
+            top.destroy()
+            self.load_account()
+            log.write("账号已保存")
+
+        top = tk.Toplevel()
+        top.title("录入账号")
+        top.geometry("400x250")
+        top.wm_attributes("-topmost", True)
+        tk.Label(top, text="用户名").pack(pady=5)
+        e1 = tk.Entry(top)
+        e1.pack()
+        tk.Label(top, text="密码").pack(pady=5)
+        e2 = tk.Entry(top, show="*")
+        e2.pack()
+        tk.Button(top, text="确定", command=save).pack(pady=10)
+        top.wait_window()
+
+    def delete_account(self):
+        if core.delete_account(): log.write("本地账号已删除")
+        else: log.write("配置文件不存在")
+        self.write_account()
+
+    # ---------- 后台认证 ----------
+    def start_auth(self):
+        if not self.account: log.write("未录入账号"); return
+        if self.engine is not None and self.engine.running: log.write("后台认证已在运行"); return
+        self.engine = core.Engine(self.account, view=TkView(self), offline=self.offline)
+        self.engine.start()
+        log.write("后台认证已启动")
+
+    def stop_auth(self):
+        if self.engine is not None: self.engine.stop()
+        log.write("后台认证已停止")
+
+    def pump(self):
+        self.ui.drain()
+        self.box.drain()
+        self.root.after(UI_INTERVAL, self.pump)
+
+    def run(self):
+        if not self.load_account():
+            self.write_account()
+        else:
+            log.write("账号已加载，点击【开始认证】启动后台检测")
+        self.pump()
+        self.root.mainloop()
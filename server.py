@@ -1,52 +1,201 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import asyncio
+import aiohttp
 from aiohttp import web
-from urllib.parse import parse_qs
 import json
 import time
-import subprocess as sp
 import re
 import os
+import sys
+import argparse
+import importlib
+import multiprocessing
+import multiprocessing.connection
+import shutil
+import signal
+import socket
+import tempfile
+import gzip
+import hashlib
+import struct
+import zlib
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import psutil
 import aiofiles
-from io import BytesIO
-from collections import Counter
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from cachetools import TTLCache
-import csv
-import tempfile
+import charts
+from speedlog import import_csv, parse_ts, format_ts
+from storage import FileStore, SqliteStore
 
 # ------------------ 配置 ------------------
 CONFIG_FILE = 'count.yml'   #记录使用过客户端的ip
 LOG_FILE    = 'user_count_log.json'   #记录没小时在线人数，用于统计
 FEEDBACK_FILE='feedback.txt'  #记录用户的反馈内容
-SPEED_LOG_FILE='speedlog.csv'   #小时测速记录
+SPEED_LOG_FILE='speedlog.bin'   #小时测速记录（定长二进制，见 speedlog.py）
+SPEED_CSV_FILE='speedlog.csv'   #旧版 csv 测速记录，启动时自动导入
+SESSION_FILE = 'sessions.json'   #在线会话快照（文件存储时），用于重启后恢复
+STORAGE = 'file'   #存储方式：file 为上面这些文件，sqlite 为 SQLITE_FILE 数据库（首次使用时自动导入已有文件）
+SQLITE_FILE = 'drcom.db'   #sqlite 存储的数据库文件
 SPEED_ENDPOINT = ''      #测速服务器
+INDEX_TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html')   #首页模板
+TIP_TEXT = "我是小贴士"   #小贴士内容，多条用 | 分隔，客户端随机展示
+LATEST_VER = ""   #客户端最新版本号
 CACHE_TTL   = 300
+CHART_WORKERS = 1    #图表渲染进程数
+MAX_PLOT_POINTS = 400   #在线趋势图最多绘制的点数，超出时改用更粗的分辨率
+LINE_RANGES = {'day': 86400, 'week': 7 * 86400, 'month': 30 * 86400, 'year': 365 * 86400, 'all': None}   #趋势图可选时间范围
+METRICS_INTERVAL = 5   #系统状态采样间隔(秒)
+STATUS_PUSH_INTERVAL = 2   #仪表盘状态推送检查间隔(秒)
+SSE_KEEPALIVE = 15   #推送连接保活间隔(秒)
+NEOFETCH_TTL = 6 * 3600   #neofetch输出缓存时间(秒)
+DEVICE_FLUSH_INTERVAL = 10   #新设备ip批量写入间隔(秒)
+SESSION_SAVE_INTERVAL = 10   #在线会话快照保存间隔(秒)
+CLIENT_TIMEOUT = 20   #超过该时间(秒)没有心跳的客户端视为离线，客户端的轮询上限由它推算（client_core.SERVER_CLIENT_TIMEOUT），修改时两边一起改
+CLEANUP_INTERVAL = 1   #离线客户端清理间隔(秒)
+BATCH_MAX_ITEMS = 5000   #批量心跳单次最多上报的设备数
+FORWARD_TIMEOUT = 1   #多进程时转发心跳给属主进程的应答超时(秒)，超时返回 503 由客户端重试
+WORKER_RESTART_DELAY = 1   #多进程时工作进程退出后，隔多久(秒)重新启动
 response_cache = TTLCache(maxsize=100, ttl=CACHE_TTL)
-clients = {}
+clients = OrderedDict()   #ip -> 会话，按最后心跳时间从旧到新排列
+user_sessions = {}   #账号 -> 在线ip集合，心跳时增量维护
+system_metrics = {'cpu': 0.0, 'mem_used': 0, 'mem_total': 0, 'load': 0.0, 'uptime': 0}   #后台定时采样，请求只读
+neofetch_text = "neofetch 加载中..."
+latest_speed = None   #最近一次测速结果
+history_ready = asyncio.Event()   #在线人数、测速历史在后台加载完成后置位，画图前等待
 web_port=80          #web服务端口
-if not os.path.exists(CONFIG_FILE):
-    open(CONFIG_FILE, 'w').close()
-    open(LOG_FILE, 'w').close()
-    open(FEEDBACK_FILE, 'w').close()
-    open(SPEED_LOG_FILE, 'w').close()
+udp_port=0           #UDP心跳端口，0为不开启
+workers=1            #工作进程数，大于1时多个进程通过 SO_REUSEPORT 共用端口
+cluster = None       #多进程时本进程的 Cluster，单进程为 None
+TIP_HASH = zlib.crc32(TIP_TEXT.encode('utf-8'))
+VER_HASH = zlib.crc32(LATEST_VER.encode('utf-8'))
 
-# ------------------ 工具 ------------------
-async def add_client_id(ip, filename=CONFIG_FILE):
-    try:
-        if not os.path.exists(filename):
-            async with aiofiles.open(filename, 'w') as f: await f.write('')
-        async with aiofiles.open(filename, 'r', encoding='utf-8') as f:
-            exist = f.read().strip().split(',')
-        if ip in exist: return
-        async with aiofiles.open(filename, 'a', encoding='utf-8') as f:
-            await f.write(f"{ip},")
-    except Exception as e:
-        print(f"添加客户端ID错误: {e}")
+# ------------------ 存储 ------------------
+# 设备、在线人数、测速、会话的持久化都经过 store（见 storage.py），启动时按 STORAGE 打开
+store = None
+speed_log = None   #测速记录，接口同 speedlog.SpeedLog
+
+def open_store():
+    global store, speed_log
+    files = FileStore(CONFIG_FILE, LOG_FILE, SPEED_LOG_FILE, SESSION_FILE)
+    store = files if STORAGE == 'file' else SqliteStore(SQLITE_FILE, legacy=files)
+    store.open()
+    speed_log = store.speed
+
+# ------------------ 设备登记 ------------------
+class DeviceRegistry:
+    """使用过客户端的设备ip集合：启动时读一次，之后只在内存中查重，新ip定时批量写入存储"""
+    def __init__(self):
+        self.devices = set()
+        self.pending = []
+
+    def load(self, ips, owns=None):
+        """并入存储中已有的 ip；owns 给出时只保留本进程负责的 ip（多进程按 ip 哈希分片）
+        端口先于存储打开，这之前心跳登记的 ip 已在集合里，其中存储已有的不再重复写入"""
+        loaded = {ip for ip in ips if owns is None or owns(ip)}
+        self.pending = [ip for ip in self.pending if ip not in loaded]
+        self.devices |= loaded
+
+    def add(self, ip):
+        if ip in self.devices: return
+        self.devices.add(ip)
+        self.pending.append(ip)
+
+    @property
+    def total_devices(self):
+        return len(self.devices)
+
+    async def flush(self):
+        if not self.pending: return
+        batch, self.pending = self.pending, []
+        try:
+            await asyncio.to_thread(store.add_devices, batch)
+        except Exception as e:
+            self.pending[:0] = batch
+            print(f"添加客户端ID错误: {e}")
+
+devices = DeviceRegistry()
+
+# ------------------ 在线人数记录 ------------------
+_UTC_OFFSET = datetime.now().astimezone().utcoffset().total_seconds()
+
+class Rollup:
+    """按固定时间桶降采样的在线人数：每个桶记录最小、最大、总和与点数"""
+    def __init__(self, width, align=0.0):
+        self.width = width
+        self.align = align + _UTC_OFFSET   # 桶边界按本地时间对齐
+        self.start = array('d'); self.min = array('l'); self.max = array('l')
+        self.sum = array('d'); self.n = array('l')
+
+    def add(self, ts, count):
+        b = (ts + self.align) // self.width * self.width - self.align
+        i = len(self.start) - 1
+        if i < 0 or self.start[i] != b:
+            i = bisect_left(self.start, b)
+            if i == len(self.start) or self.start[i] != b:
+                for col, v in ((self.start, b), (self.min, count), (self.max, count), (self.sum, 0.0), (self.n, 0)):
+                    col.insert(i, v)
+        if count < self.min[i]: self.min[i] = count
+        if count > self.max[i]: self.max[i] = count
+        self.sum[i] += count; self.n[i] += 1
+
+    def window(self, since=None):
+        """返回 since 所在的桶及之后各桶的 (起始时间, 最小, 最大, 平均)；since 为 None 时返回全部"""
+        if since is None: i = 0
+        else: i = bisect_left(self.start, (since + self.align) // self.width * self.width - self.align)   # 部分覆盖的第一个桶也保留
+        return (self.start[i:], self.min[i:], self.max[i:],
+                array('d', (s / n for s, n in zip(self.sum[i:], self.n[i:]))))
+
+ROLLUP_WIDTHS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+class UserCountSeries:
+    """每小时在线人数的内存时间序列：每次只从存储读取上次之后新增的记录"""
+    def __init__(self):
+        self.cursor = None
+        self.lock = asyncio.Lock()   # 并发的 refresh 不能用同一个位置重复读取
+        self.ts = array('d')       # epoch 秒
+        self.counts = array('l')
+        self._reset_rollups()
+
+    def _reset_rollups(self):
+        self.rollups = {name: Rollup(w, 3 * 86400 if name == 'week' else 0.0) for name, w in ROLLUP_WIDTHS.items()}   # 周从周一开始
+
+    def load(self):
+        """同步读取并计入新增记录，启动时在线程中调用；之后由事件循环调用 refresh"""
+        self._apply(*store.read_counts(self.cursor))
+
+    async def refresh(self):
+        # 只在线程中读存储（sqlite 可能要等锁），计入内存序列仍在事件循环中做，画图读取时不会看到一半的数据
+        async with self.lock:
+            self._apply(*await asyncio.to_thread(store.read_counts, self.cursor))
+
+    def _apply(self, reset, rows, cursor):
+        self.cursor = cursor
+        if reset:     # 记录被截断或替换，从头重建
+            self.ts = array('d'); self.counts = array('l'); self._reset_rollups()
+        for ts, count in rows:
+            self.ts.append(ts); self.counts.append(count)
+            for r in self.rollups.values(): r.add(ts, count)
+
+    def query(self, span):
+        """按时间范围选择分辨率：取点数不超过 MAX_PLOT_POINTS 的最细分辨率"""
+        now = time.time()
+        since = None if span is None else now - span
+        if span is None: span = now - self.ts[0] if self.ts else 0
+        for name, width in ROLLUP_WIDTHS.items():
+            if span / width <= MAX_PLOT_POINTS: break
+        starts, mins, maxs, avgs = self.rollups[name].window(since)
+        if len(starts) > MAX_PLOT_POINTS:
+            starts, mins, maxs, avgs = (col[-MAX_PLOT_POINTS:] for col in (starts, mins, maxs, avgs))
+        return name, starts, mins, maxs, avgs
+
+user_counts = UserCountSeries()
 
+# ------------------ 工具 ------------------
 async def save_feedback(ip, feedback_text):
     try:
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -58,8 +207,77 @@ async def save_feedback(ip, feedback_text):
         print(f"保存反馈错误: {e}")
         return False
 
-def count_keys_with_specific_user(nested_dict, specific_user):
-    return [v.get('user') for v in nested_dict.values()].count(specific_user)
+# ------------------ 在线会话 ------------------
+pie_dirty = False   #账号分布变化后置位，由推送任务统一刷新饼图
+
+def _unindex_user(ip, user):
+    global pie_dirty
+    ips = user_sessions.get(user)
+    if ips is None: return
+    ips.discard(ip); pie_dirty = True
+    if not ips: del user_sessions[user]
+
+class ClientRecord:
+    """在线会话记录：账号、密码、平台字符串驻留(intern)后共享，重复心跳原地更新"""
+    __slots__ = ('timestamp', 'user', 'pwd', 'pt')
+
+    def __init__(self, timestamp, user, pwd, pt):
+        self.timestamp = timestamp
+        self.user = sys.intern(user); self.pwd = sys.intern(pwd); self.pt = sys.intern(pt)
+
+    def __repr__(self):
+        return repr({'timestamp': self.timestamp, 'user': self.user, 'pwd': self.pwd, 'pt': self.pt})
+
+def drop_client(ip):
+    rec = clients.pop(ip, None)
+    if rec is not None: _unindex_user(ip, rec.user)
+
+def expire_clients(now=None):
+    """从最早心跳的一端弹出超时的客户端，只触及已过期的条目"""
+    cutoff = (now or time.time()) - CLIENT_TIMEOUT
+    while clients:
+        ip, rec = next(iter(clients.items()))
+        if rec.timestamp >= cutoff: break
+        drop_client(ip)
+
+def register_heartbeat(ip, user, pwd, pt):
+    """登记一次心跳，返回该账号当前在线设备数"""
+    global pie_dirty
+    rec = clients.get(ip)
+    if rec is None:
+        rec = clients[ip] = ClientRecord(time.time(), user, pwd, pt)
+    else:
+        rec.timestamp = time.time()
+        if rec.user != user: _unindex_user(ip, rec.user); rec.user = sys.intern(user)
+        if rec.pwd != pwd: rec.pwd = sys.intern(pwd)
+        if rec.pt != pt: rec.pt = sys.intern(pt)
+        clients.move_to_end(ip)
+    user = rec.user
+    ips = user_sessions.get(user)
+    if ips is None: ips = user_sessions[user] = set()
+    if ip not in ips: ips.add(ip); pie_dirty = True
+    return len(ips)
+
+def session_rows():
+    # 快照不含密码：热重启只需要 ip、时间、账号、平台，密码只留在内存里，下次心跳时补上
+    return [(ip, rec.timestamp, rec.user, rec.pt) for ip, rec in clients.items()]
+
+def restore_sessions(rows, owns=None):
+    """热重启：恢复上次保存的、尚未超时的会话，返回恢复的条数
+    端口先于存储打开，已经收到心跳的 ip 以心跳为准；恢复后按心跳时间重新排序，保证过期清理的顺序"""
+    cutoff = time.time() - CLIENT_TIMEOUT
+    n = 0
+    for ip, ts, user, pt in sorted(rows, key=lambda r: r[1]):
+        if ts < cutoff or (owns is not None and not owns(user)): continue
+        rec = clients.get(ip)
+        if rec is not None and rec.timestamp >= ts: continue
+        drop_client(ip)             # 同一 ip 出现在多个快照里时保留最新的
+        rec = clients[ip] = ClientRecord(ts, user, '', pt)
+        user_sessions.setdefault(rec.user, set()).add(ip)
+        n += 1
+    if n:
+        for ip in sorted(clients, key=lambda ip: clients[ip].timestamp): clients.move_to_end(ip)
+    return n
 
 def sig_bar(dbm: int) -> str:
     if dbm >= -50: return "▂▄▆█"
@@ -67,25 +285,27 @@ def sig_bar(dbm: int) -> str:
     if dbm >= -70: return "▂▄  "
     return "▂   "
 
-async def sys_status():
-    with open("/proc/stat") as f: cpu1 = f.readline()
-    idle1 = sum(int(x) for x in cpu1.split()[4:8])
-    total1 = sum(int(x) for x in cpu1.split()[1:])
-    await asyncio.sleep(1)
-    with open("/proc/stat") as f: cpu2 = f.readline()
-    idle2 = sum(int(x) for x in cpu2.split()[4:8])
-    total2 = sum(int(x) for x in cpu2.split()[1:])
-    cpu_usage = 100 * (1 - (idle2 - idle1) / (total2 - total1))
-    mem = {}
-    with open("/proc/meminfo") as f:
-        for line in f:
-            if line.startswith("MemTotal:"): mem["total"] = int(line.split()[1]) // 1024
-            elif line.startswith("MemAvailable:"): mem["avail"] = int(line.split()[1]) // 1024
-    mem["used"] = mem["total"] - mem["avail"]
-    load = os.getloadavg()[0]
-    uptime = int(sp.check_output("awk '{print int($1)}' /proc/uptime", shell=True).decode().strip() or 0)
-    uptime_h = uptime // 3600; uptime_m = (uptime % 3600) // 60
-    return f"CPU:{cpu_usage:4.1f}%  内存:{mem['used']}/{mem['total']}MB  负载:{load:.2f}  运行:{uptime_h}h{uptime_m}m"
+def sys_status():
+    m = system_metrics
+    uptime_h = m['uptime'] // 3600; uptime_m = (m['uptime'] % 3600) // 60
+    return f"CPU:{m['cpu']:4.1f}%  内存:{m['mem_used']}/{m['mem_total']}MB  负载:{m['load']:.2f}  运行:{uptime_h}h{uptime_m}m"
+
+# ------------------ 首页 ------------------
+# 首页是静态模板，启动时编译一次（neofetch 刷新后重建），动态数据全部由 /api/status 提供
+with open(INDEX_TEMPLATE_FILE, encoding='utf-8') as f: INDEX_TEMPLATE = f.read()
+homepage = None
+
+def build_homepage():
+    global homepage
+    neofetch_html = (
+        '<div class="neofetch-card" style="background:rgba(255,255,255,.08);border-radius:15px;padding:20px;margin:20px 30px;box-shadow:0 8px 32px rgba(0,0,0,.2);backdrop-filter:blur(5px);border:1px solid rgba(255,255,255,.1);">'
+        '<div class="neofetch-title" style="font-size:1.4em;color:#e0f7fa;margin-bottom:15px;font-weight:500;text-align:center;">🖥️ 本机系统信息（neofetch）</div>'
+        "<pre style='white-space:pre-wrap;font-size:12px;color:#e0f7fa;'>" +
+        neofetch_text.replace("<", "&lt;").replace(">", "&gt;") + "</pre></div>"
+    )
+    body = INDEX_TEMPLATE.replace('<!--NEOFETCH-->', neofetch_html).encode('utf-8')
+    digest = hashlib.md5(body).hexdigest()
+    homepage = {'body': body, 'gzip': gzip.compress(body, 9), 'etag': f'"{digest}"', 'etag_gzip': f'"{digest}-gz"'}
 
 def html_snapshot(text):
     import html
@@ -133,7 +353,7 @@ async def scan_only():
                 if "DS Parameter set: channel " in line:
                     block["chan"] = int(line.split()[-1])
             if block: aps.append(block)
-            out = ["=" * 60, await sys_status(), "=" * 60,
+            out = ["=" * 60, sys_status(), "=" * 60,
                    f"周边 Wi-Fi 数量：{len(aps)}",
                    "信号  SSID                      信道  BSSID"]
             out.append("-" * 65)
@@ -156,71 +376,205 @@ async def scan_only():
 async def cleanup_clients():
     while True:
         try:
-            current_time = time.time()
-            expired = [cid for cid, data in clients.items() if current_time - data['timestamp'] > 20]
-            for cid in expired: del clients[cid]
-            await asyncio.sleep(10)
+            expire_clients()
+            if cluster is not None: cluster.publish()
         except Exception as e:
             print(f"清理客户端错误: {e}")
-            await asyncio.sleep(10)
+        await asyncio.sleep(CLEANUP_INTERVAL)
+
+async def metrics_sampler():
+    psutil = await asyncio.to_thread(importlib.import_module, 'psutil')   # 端口监听后再在后台导入
+    psutil.cpu_percent(interval=None)       # 首次调用只建立基准，之后取两次采样之间的平均值
+    while True:
+        try:
+            mem = psutil.virtual_memory()
+            system_metrics.update(cpu=round(psutil.cpu_percent(interval=None), 1),
+                                  mem_used=mem.used // 1024 // 1024, mem_total=mem.total // 1024 // 1024,
+                                  load=os.getloadavg()[0], uptime=int(time.time() - psutil.boot_time()))
+        except Exception as e:
+            print(f"系统状态采样错误: {e}")
+        await asyncio.sleep(METRICS_INTERVAL)
+
+async def neofetch_refresher():
+    global neofetch_text
+    while True:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "neofetch", "--color_blocks", "off", "--stdout",
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+            try:
+                stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=30)
+                neofetch_text = stdout.decode(errors='replace')
+                build_homepage()
+            except asyncio.TimeoutError:
+                proc.kill(); await proc.wait()
+        except FileNotFoundError:
+            neofetch_text = "neofetch 未安装"; build_homepage(); return
+        except Exception as e:
+            print(f"neofetch 错误: {e}")
+        await asyncio.sleep(NEOFETCH_TTL)
+
+async def flush_devices():
+    while True:
+        await asyncio.sleep(DEVICE_FLUSH_INTERVAL)
+        await devices.flush()
+
+async def save_sessions():
+    rows = session_rows()
+    try:
+        await asyncio.to_thread(store.save_sessions, 0 if cluster is None else cluster.index, rows)
+    except Exception as e:
+        print(f"保存在线会话错误: {e}")
+
+async def session_saver():
+    while True:
+        await asyncio.sleep(SESSION_SAVE_INTERVAL)
+        await save_sessions()
 
 async def save_user_count():
+    await history_ready.wait()
     while True:
         try:
             now = datetime.now()
             next_hour = (now + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
             await asyncio.sleep((next_hour - now).total_seconds())
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            user_count = len(clients)
-            data = {"timestamp": current_time, "user_count": user_count}
-            async with aiofiles.open(LOG_FILE, "a", encoding='utf-8') as f:
-                await f.write(json.dumps(data, ensure_ascii=False) + "\n")
-            for k in list(response_cache.keys()):
-                if 'plot' in str(k) or 'pie' in str(k): del response_cache[k]
+            await asyncio.to_thread(store.add_count, time.time(), online_total())
+            await user_counts.refresh()     # 新记录同时计入各级汇总
+            invalidate_chart('line_plot'); invalidate_chart('user_pie')
+            if cluster is not None: cluster.counts_saved()   # 通知其它进程刷新趋势图
         except Exception as e:
             print(f"保存用户数量错误: {e}")
             await asyncio.sleep(60)
 
+# ------------------ 推送 ------------------
+def sse_message(event, data):
+    return f"event: {event}\ndata: {data}\n\n".encode('utf-8')
+
+class EventHub:
+    """仪表盘推送(SSE)：所有订阅者共享同一份状态快照，只在内容变化时广播"""
+    def __init__(self):
+        self.subscribers = set()
+        self.last_status = None
+
+    def subscribe(self):
+        q = asyncio.Queue(maxsize=32); self.subscribers.add(q); return q
+
+    def unsubscribe(self, q):
+        self.subscribers.discard(q)
+
+    def publish(self, event, data):
+        msg = sse_message(event, data)
+        for q in self.subscribers:
+            try: q.put_nowait(msg)
+            except asyncio.QueueFull: pass     # 客户端太慢，丢掉这条，下一次状态会覆盖
+
+events = EventHub()
+
+async def status_snapshot():
+    active_clients = await all_clients()
+    speed_result = latest_speed
+    return {
+        'total_devices': devices.total_devices if cluster is None else cluster.devices_total(),
+        'online': len(active_clients),
+        'cpu': system_metrics['cpu'],
+        'mem_used': system_metrics['mem_used'],
+        'mem_total': system_metrics['mem_total'],
+        'ping_ms':  speed_result.get('ping_ms')   if isinstance(speed_result, dict) else None,
+        'down_mbps':speed_result.get('download_Mbps') if isinstance(speed_result, dict) else None,
+        'up_mbps':  speed_result.get('upload_Mbps')   if isinstance(speed_result, dict) else None,
+        'users': [{'ip':ip, 'pt':rec.pt or '未知'} for ip,rec in active_clients.items()]
+    }
+
+def invalidate_chart(name):
+    for k in [k for k in response_cache.keys() if k.split(':')[0] == name]: del response_cache[k]
+    events.publish('chart', name)
+
+async def status_broadcaster():
+    global pie_dirty
+    while True:
+        try:
+            await asyncio.sleep(STATUS_PUSH_INTERVAL)
+            if cluster is not None:
+                if cluster.pie_changed(): invalidate_chart('user_pie')
+                if cluster.counts_changed(): invalidate_chart('line_plot')
+            elif pie_dirty:
+                pie_dirty = False; invalidate_chart('user_pie')
+            if not events.subscribers: continue
+            data = json.dumps(await status_snapshot(), ensure_ascii=False)
+            if data != events.last_status:
+                events.last_status = data; events.publish('status', data)
+        except Exception as e:
+            print(f"状态推送错误: {e}")
+
 # ------------------ 画图 ------------------
-async def generate_line_plot():
-    cache_key = "line_plot"
+chart_pool = None
+chart_inflight = {}
+
+def get_chart_pool():
+    # 用 forkserver 启动渲染进程：此时主进程已有 to_thread 的线程，直接 fork 多线程进程可能死锁
+    global chart_pool
+    if chart_pool is None:
+        chart_pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, initializer=charts.init_worker,
+                                         mp_context=multiprocessing.get_context('forkserver'))
+    return chart_pool
+
+async def render_chart(func, *args):
+    # 渲染进程异常退出（如内存不足）后进程池不可再用，丢弃后新建一个重试一次
+    global chart_pool
+    for attempt in range(2):
+        pool = get_chart_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            if chart_pool is pool:
+                chart_pool = None; pool.shutdown(wait=False)
+            if attempt: raise
+            print("图表进程异常退出，重建进程池")
+
+async def warm_chart_pool():
+    """启动渲染进程并加载 matplotlib，第一次请求图表时不必再等"""
+    try:
+        await render_chart(charts.init_worker)
+    except Exception as e:
+        print(f"图表进程启动错误: {e}")
+
+async def single_flight(key, factory):
+    """同一张图的并发请求共用一次生成过程"""
+    task = chart_inflight.get(key)
+    if task is None:
+        task = chart_inflight[key] = asyncio.ensure_future(factory())
+        task.add_done_callback(lambda t: chart_inflight.pop(key, None) if chart_inflight.get(key) is t else None)
+    return await asyncio.shield(task)
+
+async def generate_line_plot(range_name='all'):
+    cache_key = f"line_plot:{range_name}"
     if cache_key in response_cache: return response_cache[cache_key]
+    return await single_flight(cache_key, lambda: _build_line_plot(range_name))
+
+async def _build_line_plot(range_name):
+    cache_key = f"line_plot:{range_name}"
+    await history_ready.wait()
     try:
-        async with aiofiles.open(LOG_FILE, "r", encoding="utf-8") as f:
-            raw = await f.read()
-        objs = [json.loads(l) for l in raw.strip().splitlines() if l.strip()]
-        ts = [datetime.strptime(o['timestamp'], '%Y-%m-%d %H:%M:%S') for o in objs]
-        us = [o['user_count'] for o in objs]
-        plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
-        plt.rcParams['axes.unicode_minus'] = False
-        plt.figure(figsize=(10, 5))
-        plt.plot(ts, us, marker='o', linestyle='-', color='b', label='用户数量')
-        plt.title('user/time'); plt.xlabel('time'); plt.ylabel('user')
-        plt.legend(); plt.grid(True); plt.tight_layout()
-        buf = BytesIO(); plt.savefig(buf, format='png', dpi=80); plt.close()
-        img = buf.getvalue(); buf.close()
+        await user_counts.refresh()
+        resolution, starts, mins, maxs, avgs = user_counts.query(LINE_RANGES[range_name])
+        img = await render_chart(charts.render_line_plot, resolution, starts, mins, maxs, avgs)
         response_cache[cache_key] = img; return img
     except Exception as e:
-        plt.figure(figsize=(10, 5)); plt.text(0.5, 0.5, 'none', ha='center'); plt.axis('off')
-        buf = BytesIO(); plt.savefig(buf, format='png'); plt.close(); img = buf.getvalue(); buf.close(); return img
+        return await render_chart(charts.render_message, 'none', (10, 5))
 
 async def generate_user_pie():
     cache_key = "user_pie"
     if cache_key in response_cache: return response_cache[cache_key]
+    return await single_flight(cache_key, _build_user_pie)
+
+async def _build_user_pie():
+    cache_key = "user_pie"
     try:
-        cnt = Counter(data['user'] for data in clients.values() if data.get('user'))
-        plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
-        plt.rcParams['axes.unicode_minus'] = False
-        if not cnt:
-            plt.figure(figsize=(4, 4)); plt.text(0.5, 0.5, 'None', ha='center'); plt.axis('off')
-        else:
-            labels, sizes = zip(*cnt.items())
-            plt.figure(figsize=(5, 5)); plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, shadow=True); plt.title('user'); plt.axis('equal')
-        buf = BytesIO(); plt.savefig(buf, format='png', dpi=80); plt.close(); img = buf.getvalue(); buf.close()
+        cnt = Counter(rec.user for rec in (await all_clients()).values() if rec.user)
+        img = await render_chart(charts.render_user_pie, dict(cnt))
         response_cache[cache_key] = img; return img
     except Exception as e:
-        plt.figure(figsize=(4, 4)); plt.text(0.5, 0.5, '生成错误', ha='center'); plt.axis('off')
-        buf = BytesIO(); plt.savefig(buf, format='png'); plt.close(); img = buf.getvalue(); buf.close(); return img
+        return await render_chart(charts.render_message, '生成错误', (4, 4))
 
 # ------------------ 速度监控 ------------------
 
@@ -250,435 +604,646 @@ async def speed_test():
         result = f"测速异常: {str(e)}"
         response_cache[cache_key] = result; return result
 
+def load_speed_log(import_old=True):
+    if import_old and len(speed_log) == 0 and os.path.exists(SPEED_CSV_FILE) and os.path.getsize(SPEED_CSV_FILE) > 0:
+        print(f"[速度日志] 已从 {SPEED_CSV_FILE} 导入 {import_csv(SPEED_CSV_FILE, speed_log)} 条记录")
+    last = speed_log.last()
+    if last is None: return None
+    ts, ping, down, up = last
+    return {'timestamp': format_ts(ts), 'ping_ms': ping, 'download_Mbps': down, 'upload_Mbps': up}
+
 async def save_speed_log(ts, ping, down, up):
     try:
-        exists = os.path.exists(SPEED_LOG_FILE)
-        with open(SPEED_LOG_FILE, 'a', newline='') as f:
-            writer = csv.writer(f)
-            if not exists: writer.writerow(['timestamp', 'ping_ms', 'download_Mbps', 'upload_Mbps'])
-            writer.writerow([ts, ping, down, up])
+        await asyncio.to_thread(speed_log.append, parse_ts(ts), ping, down, up)
     except Exception as e:
         print(f"[速度日志] 保存错误: {e}")
 
 async def generate_speed_chart():
     cache_key = "speed_chart"
     if cache_key in response_cache: return response_cache[cache_key]
-    if not os.path.exists(SPEED_LOG_FILE):
-        plt.figure(figsize=(10, 4)); plt.text(0.5, 0.5, '暂无速度数据', ha='center'); plt.axis('off')
-        buf = BytesIO(); plt.savefig(buf, format='png', dpi=80); plt.close(); img = buf.getvalue(); buf.close(); return img
+    return await single_flight(cache_key, _build_speed_chart)
+
+async def _build_speed_chart():
+    cache_key = "speed_chart"
+    await history_ready.wait()
     try:
-        times, pings, downs, ups = [], [], [], []
-        cutoff = datetime.now() - timedelta(hours=12)          # 仅保留近 12 小时
-        with open(SPEED_LOG_FILE, 'r') as f:
-            reader = csv.reader(f); next(reader, None)
-            for row in reader:
-                if len(row) >= 4:
-                    try:
-                        dt = datetime.fromisoformat(row[0].replace('Z', ''))
-                        if dt >= cutoff:
-                            times.append(dt); pings.append(float(row[1])); downs.append(float(row[2])); ups.append(float(row[3]))
-                    except:
-                        continue
+        times, pings, downs, ups = await asyncio.to_thread(speed_log.window, time.time() - 12 * 3600)    # 仅取近 12 小时
         if len(times) < 2:
-            plt.figure(figsize=(10, 4)); plt.text(0.5, 0.5, '数据不足，请等待更多测试', ha='center'); plt.axis('off')
-            buf = BytesIO(); plt.savefig(buf, format='png', dpi=80); plt.close(); img = buf.getvalue(); buf.close(); return img
-        plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']; plt.rcParams['axes.unicode_minus'] = False
-        fig, ax = plt.subplots(figsize=(10, 4))
-        if downs: ax.plot(times, downs, label='download (Mbps)', color='#2E8B57', linewidth=1.5)
-        if ups:   ax.plot(times, ups,   label='upload (Mbps)',   color='#1F77B4', linewidth=1.5)
-        if pings: ax.plot(times, pings, label='ping (ms)',       color='#FF6F00', linewidth=1.2, alpha=0.8)
-        ax.set_ylabel('speed / ping'); ax.set_xlabel('time (UTC)'); ax.grid(True, alpha=0.2); ax.legend(loc='upper left', fontsize=9)
-        from matplotlib.dates import DateFormatter; ax.xaxis.set_major_formatter(DateFormatter('%H:%M')); plt.xticks(rotation=30, fontsize=8); plt.tight_layout()
-        temp_fd, temp_path = tempfile.mkstemp(suffix='.png'); os.close(temp_fd); plt.savefig(temp_path, dpi=80, bbox_inches='tight'); plt.close(fig)
-        with open(temp_path, 'rb') as f: img = f.read(); os.remove(temp_path); response_cache[cache_key] = img; return img
+            has_data = await asyncio.to_thread(len, speed_log)
+            return await render_chart(charts.render_message, '数据不足，请等待更多测试' if has_data else '暂无速度数据')
+        img = await render_chart(charts.render_speed_chart, times, pings, downs, ups)
+        response_cache[cache_key] = img; return img
     except Exception as e:
         print(f"[速度图表] 生成错误: {e}")
-        plt.figure(figsize=(10, 4)); plt.text(0.5, 0.5, '图表生成失败', ha='center'); plt.axis('off')
-        buf = BytesIO(); plt.savefig(buf, format='png'); plt.close(); img = buf.getvalue(); buf.close(); return img
+        return await render_chart(charts.render_message, '图表生成失败')
 
 async def speed_monitor_task():
+    global latest_speed
     while True:
         try:
             await asyncio.sleep(3600)           # 整点测速
             print(f"[速度监控] 定时测试开始 ({datetime.now().strftime('%H:%M:%S')})")
             result = await speed_test()
             if isinstance(result, dict):
+                latest_speed = result
                 print(f"[速度监控] 完成 - Ping: {result['ping_ms']:.1f}ms, Down: {result['download_Mbps']:.2f}Mbps, Up: {result['upload_Mbps']:.2f}Mbps")
-                if "speed_chart" in response_cache: del response_cache["speed_chart"]
+                invalidate_chart('speed_chart')
             else:
                 print(f"[速度监控] 失败: {result}")
         except Exception as e:
             print(f"[速度监控] 任务错误: {e}")
             await asyncio.sleep(300)
 
-# ------------------ 路由 ------------------
-def get_pt_by_ip(data: dict, ip: str) -> str:
-    return data.get(ip, {}).get('pt') or '未知'
-
-async def handle(request):
-    path = request.path
-    query_params = parse_qs(request.query_string)
-    client_ip = request.transport.get_extra_info('peername')[0]
-    print(f"\033[94m[请求] {client_ip} - {path}\033[0m")
-    try:
-        # ---- 前端轮询接口 ----
-        if path == '/api/status':
-            active_clients = await get_active_clients()
-            cpu = psutil.cpu_percent(interval=0.1)
-            mem = psutil.virtual_memory()
-            speed_result = await speed_test()
-            async with aiofiles.open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                content = await f.read()
-            total_devices = max(0, len(content.split(',')) - 1)
-            return web.Response(text=json.dumps({
-                'total_devices': total_devices,
-                'online': len(active_clients),
-                'cpu': round(cpu, 1),
-                'mem_used': mem.used // 1024 // 1024,
-                'mem_total': mem.total // 1024 // 1024,
-                'ping_ms':  speed_result.get('ping_ms')   if isinstance(speed_result, dict) else None,
-                'down_mbps':speed_result.get('download_Mbps') if isinstance(speed_result, dict) else None,
-                'up_mbps':  speed_result.get('upload_Mbps')   if isinstance(speed_result, dict) else None,
-                'users': [{'ip':ip, 'pt':data.get('pt') or '未知'} for ip,data in active_clients.items()]
-            }, ensure_ascii=False), content_type='application/json')
-
-        if path == '/':
-            active_clients = await get_active_clients()
-            async with aiofiles.open(CONFIG_FILE, "r", encoding='utf-8') as fi:
-                content = await fi.read()
-                total_devices = max(0, len(content.split(",")) - 1)
-            cpu = psutil.cpu_percent(interval=0.1)
-            mem = psutil.virtual_memory()
-            used, total = mem.used // 1024 // 1024, mem.total // 1024 // 1024
-            speed_result = await speed_test()
-            # 修复：为速度数值添加 id 属性，使前端JS可以更新
-            speed_info = f"""
-                <div class="stat-card"><div class="stat-number" id="ping-ms">{speed_result.get('ping_ms','--')}ms</div><div class="stat-label">网络延迟</div></div>
-                <div class="stat-card"><div class="stat-number" id="down-mbps">{speed_result.get('download_Mbps','--')}</div><div class="stat-label">下载速度(Mbps)</div></div>
-                <div class="stat-card"><div class="stat-number" id="up-mbps">{speed_result.get('upload_Mbps','--')}</div><div class="stat-label">上传速度(Mbps)</div></div>
-            """ if isinstance(speed_result, dict) else """
-                <div class="stat-card"><div class="stat-number" id="ping-ms">--</div><div class="stat-label">网络延迟</div></div>
-                <div class="stat-card"><div class="stat-number" id="down-mbps">--</div><div class="stat-label">下载速度(Mbps)</div></div>
-                <div class="stat-card"><div class="stat-number" id="up-mbps">--</div><div class="stat-label">上传速度(Mbps)</div></div>
-            """
-            import subprocess
-            def run_neofetch():
+async def follow_speed_log():
+    # 多进程时只有 0 号进程测速，其它进程跟随测速记录文件更新最近结果
+    global latest_speed
+    while True:
+        await asyncio.sleep(60)
+        try:
+            result = await asyncio.to_thread(load_speed_log, False)
+            if result != latest_speed:
+                latest_speed = result; invalidate_chart('speed_chart')
+        except Exception as e:
+            print(f"[速度日志] 读取错误: {e}")
+
+# ------------------ UDP 心跳 ------------------
+# 请求: b'HB' + 版本(1字节) + ip、user、pwd、pt 四个字段，每个字段为 1 字节长度 + UTF-8 内容
+# 应答: b'HB' + 版本(1字节) + 该账号在线设备数(uint16)，版本 2 另附小贴士、版本号的 crc32(各 uint32)，均为网络字节序
+UDP_HEADER = struct.Struct('!2sB')
+UDP_REPLY = struct.Struct('!2sBH')
+UDP_REPLY_V2 = struct.Struct('!2sBHII')
+
+def decode_heartbeat(data):
+    magic, ver = UDP_HEADER.unpack_from(data)
+    if magic != b'HB' or ver not in (1, 2): raise ValueError('bad header')
+    fields, pos = [], UDP_HEADER.size
+    for _ in range(4):
+        n = data[pos]
+        fields.append(data[pos + 1:pos + 1 + n].decode('utf-8')); pos += 1 + n
+    if pos > len(data): raise ValueError('truncated')
+    return ver, fields
+
+class HeartbeatProtocol(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            ver, (ip, user, pwd, pt) = decode_heartbeat(data)
+        except (ValueError, IndexError, struct.error):
+            return
+        if cluster is None:
+            self.reply(ver, register_heartbeat(ip, user, pwd, pt), addr)
+            devices.add(ip)
+        else:
+            asyncio.ensure_future(self.forward(ver, ip, user, pwd, pt, addr))
+
+    async def forward(self, ver, ip, user, pwd, pt, addr):
+        try:
+            self.reply(ver, await cluster.heartbeat(ip, user, pwd, pt), addr)
+        except (OSError, asyncio.TimeoutError):
+            pass    # 属主不可达时不应答，客户端超时后改用 HTTP
+
+    def reply(self, ver, online, addr):
+        online = min(online, 0xFFFF)
+        if ver == 1: self.transport.sendto(UDP_REPLY.pack(b'HB', 1, online), addr)
+        else: self.transport.sendto(UDP_REPLY_V2.pack(b'HB', 2, online, TIP_HASH, VER_HASH), addr)
+
+# ------------------ 多进程 ------------------
+# --workers N 时启动 N 个工作进程，通过 SO_REUSEPORT 共用 web/UDP 端口，由内核分配连接
+# 在线会话按账号哈希分片：一个账号的全部设备只登记在属主进程，其它进程收到心跳后转发给属主，
+#   属主不可达时心跳返回 503 由客户端重试，绝不在本进程登记，否则同一账号的设备会分散到多个进程
+# 转发走各进程之间的 unix 流套接字（每个对端一条长连接），写满时 drain 等待，不会像数据报那样队列满就丢；
+#   帧为 长度(uint32) + 类型(1字节) + 序号(uint32) + JSON：
+#   H 一批心跳 [[ip, user, pwd, pt], ...]，属主回 R + 同一序号 + 各条的在线数；D 一批新设备 ip，不回
+# 设备登记按 ip 哈希分片，非属主进程只转发一次新 ip；连接断开时忘掉已转发的记录，之后重新转发
+# 各进程的在线数、设备数、账号分布版本号写在共享内存数组里，总数直接相加；末尾一格是在线人数记录的版本号，
+#   0 号进程每小时写入记录后加一，其它进程看到变化就让趋势图缓存失效并推送给仪表盘；
+# 在线列表、饼图等明细由各进程在 unix 套接字上的内部接口 /internal/clients 提供，需要时汇总
+FWD_FRAME = struct.Struct('!IcI')
+
+def fwd_frame(kind, seq, body):
+    data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    return FWD_FRAME.pack(len(data), kind, seq) + data
+
+async def read_frame(reader):
+    size, kind, seq = FWD_FRAME.unpack(await reader.readexactly(FWD_FRAME.size))
+    return kind, seq, json.loads(await reader.readexactly(size))
+
+class Peer:
+    """到另一个工作进程的转发连接：按需连接，断开后下次使用时重连"""
+    def __init__(self, cluster, index):
+        self.cluster, self.index = cluster, index
+        self.writer = None
+        self.waiting = {}           # 序号 -> 等待应答的 future
+        self.connecting = asyncio.Lock()
+
+    async def connect(self):
+        async with self.connecting:
+            if self.writer is not None: return self.writer
+            # 对端刚启动或正在重启时套接字还不存在，在 FORWARD_TIMEOUT 内重试
+            deadline = time.monotonic() + FORWARD_TIMEOUT
+            while True:
                 try:
-                    return subprocess.run(["neofetch", "--color_blocks", "off", "--stdout"],
-                                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                          text=True, check=False).stdout
-                except FileNotFoundError:
-                    return "neofetch 未安装"
-            neofetch_text = run_neofetch()
-            neofetch_html = (
-                '<div class="neofetch-card" style="background:rgba(255,255,255,.08);border-radius:15px;padding:20px;margin:20px 30px;box-shadow:0 8px 32px rgba(0,0,0,.2);backdrop-filter:blur(5px);border:1px solid rgba(255,255,255,.1);">'
-                '<div class="neofetch-title" style="font-size:1.4em;color:#e0f7fa;margin-bottom:15px;font-weight:500;text-align:center;">🖥️ 本机系统信息（neofetch）</div>'
-                "<pre style='white-space:pre-wrap;font-size:12px;color:#e0f7fa;'>" +
-                neofetch_text.replace("<", "&lt;").replace(">", "&gt;") + "</pre></div>"
-            )
-            mouse_trail_html = ""  # 原星光轨迹代码太长，此处省略，保持与原文件一致即可
-            # 关键修复：用 r""" 包裹整段 HTML/JS，避免 Python 解析 JS 关键字
-            response_html = r"""
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>设备监控系统</title>
-<style>
-    *{margin:0;padding:0;box-sizing:border-box}
-    body{
-        font-family:-apple-system,BlinkMacSystemFont,"Segoe UI",Roboto,"Helvetica Neue",Arial,"Noto Sans",sans-serif,"Apple Color Emoji","Segoe UI Emoji","Segoe UI Symbol","Noto Color Emoji";
-        background:linear-gradient(135deg,#0f2027,#203a43,#2c5364);
-        min-height:100vh;padding:20px;color:#e0f7fa;
-    }
-    .container{
-        max-width:1200px;margin:0 auto;background:rgba(255,255,255,.08);backdrop-filter:blur(12px);
-        border-radius:20px;border:1px solid rgba(255,255,255,.18);box-shadow:0 20px 40px rgba(0,0,0,.3);overflow:hidden;
-    }
-    .header{
-        background:linear-gradient(135deg,rgba(16,141,199,.8),rgba(0,200,200,.6));color:#fff;padding:40px 30px;text-align:center;position:relative;border-bottom:1px solid rgba(255,255,255,.2);
-    }
-    .header::before{
-        content:"";position:absolute;top:0;left:0;right:0;bottom:0;background:url('data:image/svg+xml,%3Csvg xmlns=\"http://www.w3.org/2000/svg\" viewBox=\"0 0 100 100\"%3E%3Ccircle cx=\"20\" cy=\"20\" r=\"2\" fill=\"rgba(255,255,255,.1)\"/%3E%3Ccircle cx=\"80\" cy=\"40\" r=\"1.5\" fill=\"rgba(255,255,255,.1)\"/%3E%3Ccircle cx=\"40\" cy=\"80\" r=\"1\" fill=\"rgba(255,255,255,.1)\"/%3E%3C/svg%3E');animation:float 20s infinite linear;
-    }
-    @keyframes float{0%{transform:translateY(0)}100%{transform:translateY(-100px)}}
-    .header h1{font-size:2.5em;margin-bottom:10px;position:relative;z-index:1;text-shadow:0 2px 4px rgba(0,0,0,.2)}
-    .header h2{font-size:1.2em;opacity:.9;margin:10px 0;position:relative;z-index:1;font-weight:300}
-    .stats-container{
-        display:flex;justify-content:space-around;padding:30px;background:rgba(255,255,255,.05);flex-wrap:wrap;gap:20px;border-bottom:1px solid rgba(255,255,255,.1);
-    }
-    .stat-card{
-        background:rgba(255,255,255,.1);padding:25px;border-radius:15px;text-align:center;box-shadow:0 8px 32px rgba(0,0,0,.2);transition:all .3s ease;min-width:200px;flex:1;backdrop-filter:blur(5px);border:1px solid rgba(255,255,255,.15);
-    }
-    .stat-card:hover{transform:translateY(-5px);box-shadow:0 12px 40px rgba(0,0,0,.3);background:rgba(255,255,255,.15)}
-    .stat-number{font-size:2.5em;font-weight:700;color:#4fc3f7;margin-bottom:10px;text-shadow:0 0 10px rgba(79,195,247,.5)}
-    .stat-number1{font-size:1.6em;font-weight:700;color:#4fc3f7;margin-bottom:10px;text-shadow:0 0 10px rgba(79,195,247,.5)}
-    .stat-label{color:#b3e5fc;font-size:1.1em;font-weight:500}
-    .stat-label1{color:#b3e5fc;font-size:0.9em;font-weight:500}
-    .users-section{padding:30px}
-    .section-title{font-size:1.8em;color:#e0f7fa;margin-bottom:25px;text-align:center;position:relative;font-weight:300}
-    .section-title::after{
-        content:"";position:absolute;bottom:-10px;left:50%;transform:translateX(-50%);width:60px;height:2px;background:linear-gradient(90deg,transparent,#4fc3f7,transparent);
-    }
-    .users-grid{
-        display:grid;grid-template-columns:repeat(auto-fill,minmax(300px,1fr));gap:20px;margin-bottom:40px;
-    }
-    .user-card{
-        background:rgba(255,255,255,.08);border-radius:15px;padding:20px;box-shadow:0 8px 32px rgba(0,0,0,.2);transition:all .3s ease;border-left:4px solid #4fc3f7;position:relative;overflow:hidden;backdrop-filter:blur(5px);border:1px solid rgba(255,255,255,.1);
-    }
-    .user-card:hover{transform:translateY(-5px);box-shadow:0 15px 40px rgba(0,0,0,.3);background:rgba(255,255,255,.12)}
-    .user-ip{font-size:1.2em;font-weight:600;color:#e0f7fa;margin-bottom:10px}
-    .user-status{
-        display:inline-block;padding:5px 12px;border-radius:20px;font-size:.9em;font-weight:500;background:rgba(0,200,83,.2);color:#00c853;border:1px solid rgba(0,200,83,.3);
-    }
-    .user-status.offline{background:rgba(244,67,54,.2);color:#f44336;border:1px solid rgba(244,67,54,.3)}
-    .charts-container{
-        display:flex;flex-wrap:wrap;gap:30px;justify-content:center;padding:30px;background:rgba(255,255,255,.05);border-top:1px solid rgba(255,255,255,.1);
-    }
-    .chart-wrapper{
-        background:rgba(255,255,255,.08);border-radius:15px;padding:20px;box-shadow:0 8px 32px rgba(0,0,0,.2);text-align:center;transition:all .3s ease;backdrop-filter:blur(5px);border:1px solid rgba(255,255,255,.1);
-    }
-    .chart-wrapper:hover{transform:translateY(-5px);box-shadow:0 15px 40px rgba(0,0,0,.3);background:rgba(255,255,255,.12)}
-    .chart-wrapper img{max-width:100%;height:auto;border-radius:10px}
-    .chart-title{font-size:1.3em;color:#e0f7fa;margin-bottom:15px;font-weight:500}
-    .feedback-section{
-        padding:30px;background:rgba(255,255,255,.05);border-top:1px solid rgba(255,255,255,.1);
-    }
-    .feedback-form{
-        max-width:600px;margin:0 auto;background:rgba(255,255,255,.08);padding:25px;border-radius:15px;box-shadow:0 8px 32px rgba(0,0,0,.2);backdrop-filter:blur(5px);border:1px solid rgba(255,255,255,.1);
-    }
-    .feedback-title{font-size:1.5em;color:#e0f7fa;margin-bottom:20px;text-align:center}
-    .form-group{margin-bottom:20px}
-    .form-label{display:block;color:#b3e5fc;margin-bottom:8px;font-weight:500}
-    .form-textarea{
-        width:100%;min-height:120px;padding:12px;background:rgba(255,255,255,.1);border:1px solid rgba(255,255,255,.2);border-radius:8px;color:#e0f7fa;font-size:14px;resize:vertical;transition:all .3s ease;
-    }
-    .form-textarea:focus{outline:none;border-color:#4fc3f7;box-shadow:0 0 0 2px rgba(79,195,247,.2);background:rgba(255,255,255,.15)}
-    .form-submit{
-        background:linear-gradient(135deg,#4fc3f7,#29b6f6);color:white;border:none;padding:12px 30px;border-radius:8px;font-size:16px;font-weight:600;cursor:pointer;transition:all .3s ease;width:100%;
-    }
-    .form-submit:hover{transform:translateY(-2px);box-shadow:0 5px 15px rgba(41,182,246,.4)}
-    .form-submit:active{transform:translateY(0)}
-    .success-message{
-        background:rgba(76,175,80,.2);border:1px solid rgba(76,175,80,.3);color:#4caf50;padding:12px;border-radius:8px;text-align:center;margin-top:15px;
-    }
-    @media (max-width:768px){
-        .header h1{font-size:2em}
-        .stats-container{flex-direction:column;align-items:center}
-        .users-grid{grid-template-columns:1fr}
-        .charts-container{flex-direction:column;align-items:center}
-    }
-    .fade-in{animation:fadeIn .8s ease-in}@keyframes fadeIn{from{opacity:0;transform:translateY(20px)}to{opacity:1;transform:translateY(0)}}
-</style>
-</head>
-<body>
-<div class="container fade-in">
-    <div class="header">
-        <h1>🖥️ 设备监控系统</h1>
-        <h2>实时在线用户管理面板</h2>
-       
-    </div>
-
-    <div class="stats-container" id="stats-container">
-        <div class="feedback-form">
-            <h3 class="feedback-title">最新版本下载</h3>
-            <a href="下载链接" style="display:inline-block; text-align:center;
-          width:120px; line-height:36px; background:#4fc3f7; color:#fff;
-          text-decoration:none; border-radius:4px;" target="_blank">电脑版下载<br></a>
-            <a href="下载链接 " style="display:inline-block; text-align:center;
-          width:120px; line-height:36px; background:#4fc3f7; color:#fff;
-          text-decoration:none; border-radius:4px;" target="_blank">手机版下载</a>
-            <div id="message" style="display:none;"></div>
-        </div>
-        <div class="stat-card pulse">
-            <div class="stat-number" id="total-devices">""" + str(total_devices) + r"""</div>
-            <div class="stat-label">总设备数</div>
-            <div class="stat-label1">共有""" + str(total_devices) + r"""台设备使用过改程序</div>
-        </div>
-        <div class="stat-card">
-            <div class="stat-number" id="online-count">""" + str(len(active_clients)) + r"""</div>
-            <div class="stat-label">当前在线</div>
-        </div>
-        <div class="stat-card">
-            <div class="stat-number1" id="cpu-mem">CPU:""" + f"{cpu:.1f}" + r"""%<br>内存:""" + f"{used}/{total}" + r"""MB</div>
-            <div class="stat-label1">资源占用</div>
-        </div>
-        """ + speed_info + r"""
-    </div>
-
-    <div class="users-section">
-        <h2 class="section-title">👥 活跃用户列表</h2>
-        <div class="users-grid" id="users-grid">
-            """ + ''.join(f'<div class="user-card fade-in"><div class="user-ip">📍 {client}</div><span class="user-status online">🟢 {get_pt_by_ip(clients, client)}</span></div>' for client, data in active_clients.items()) + r"""
-        </div>
-    </div>
-
-    <div class="charts-container">
-        <div class="chart-wrapper">
-            <h3 class="chart-title">📊 用户在线趋势</h3>
-            <img src="/line_plot.png?t=""" + str(int(time.time())) + r"""\" alt="用户在线趋势图" onerror="this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNDAwIiBoZWlnaHQ9IjMwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iNDAwIiBoZWlnaHQ9IjMwMCIgZmlsbD0iI2Y4ZjlmYSIvPjx0ZXh0IHg9IjIwMCIgeT0iMTUwIiB0ZXh0LWFuY2hvcj0ibWlkZGxlIiBkeT0iLjNlbSIgZm9udC1mYW1pbHk9IkFyaWFsIiBmb250LXNpemU9IjE2IiBmaWxsPSIjNjY2Ij7nkIblrZDlpJblsYLoioI8L3RleHQ+PC9zdmc+'">
-        </div>
-        <div class="chart-wrapper">
-            <h3 class="chart-title">🥧 用户账号使用情况图</h3>
-            <img src="/user_pie.png?t=""" + str(int(time.time())) + r"""\" alt="用户账号使用情况图" onerror="this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNDAwIiBoZWlnaHQ9IjMwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iNDAwIiBoZWlnaHQ9IjMwMCIgZmlsbD0iI2Y4ZjlmYSIvPjx0ZXh0IHg9IjIwMCIgeT0iMTUwIiB0ZXh0LWFuY2hvcj0ibWlkZGxlIiBkeT0iLjNlbSIgZm9udC1mYW1pbHk9IkFyaWFsIiBmb250LXNpemU9IjE2IiBmaWxsPSIjNjY2Ij7nkIblrZDlpJblsYLoioI8L3RleHQ+PC9zdmc+'">
-        </div>
-        <div class="chart-wrapper">
-            <h3 class="chart-title">🚀 12小时速度监控</h3>
-            <img src="/speed_chart.png?t=""" + str(int(time.time())) + r"""\" alt="网络速度图表" onerror="this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNDAwIiBoZWlnaHQ9IjMwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iNDAwIiBoZWlnaHQ9IjMwMCIgZmlsbD0iI2Y4ZjlmYSIvPjx0ZXh0IHg9IjIwMCIgeT0iMTUwIiB0ZXh0LWFuY2hvcj0ibWlkZGxlIiBkeT0iLjNlbSIgZm9udC1mYW1pbHk9IkFyaWFsIiBmb250LXNpemU9IjE2IiBmaWxsPSIjNjY2Ij7nkIblrZDlpJblsYLoioI8L3RleHQ+PC9zdmc+'">
-            <div style="margin-top:10px;">
-                <button onclick="window.location.href='/'" style="background:#4CAF50;color:white;border:none;padding:8px 16px;border-radius:4px;cursor:pointer;">刷新图表</button>
-            </div>
-        </div>
-    </div>
-
-    <div class="feedback-section">
-        <div class="feedback-form">
-            <h3 class="feedback-title">💬 意见反馈</h3>
-            <form id="feedbackForm" action="/feedback" method="post">
-                <div class="form-group">
-                    <label class="form-label" for="feedback">您的宝贵意见：</label>
-                    <textarea class="form-textarea" id="feedback" name="feedback" placeholder="请输入您的反馈意见、建议或遇到的问题..." required></textarea>
-                </div>
-                <button type="submit" class="form-submit">提交反馈</button>
-            </form>
-            <div id="message" style="display:none;"></div>
-        </div>
-    </div>
-    """ + neofetch_html + r"""
-</div>
-<canvas id="mouse-trail" style="position:fixed;left:0;top:0;width:100%;height:100%;pointer-events:none;z-index:9999"></canvas>
-""" + mouse_trail_html + r"""
-<script>
-document.getElementById('feedbackForm').addEventListener('submit', async function(e) {
-    e.preventDefault();
-    const form = e.target;
-    const formData = new FormData(form);
-    const submitButton = form.querySelector('button[type="submit"]');
-    const messageDiv = document.getElementById('message');
-    submitButton.disabled = true;
-    submitButton.textContent = '提交中...';
-    try {
-        const response = await fetch('/feedback', { method: 'POST', body: formData });
-        if (response.ok) {
-            messageDiv.innerHTML = '<div class="success-message">✅ 感谢您的反馈！我们已收到您的意见。</div>';
-            messageDiv.style.display = 'block';
-            form.reset();
-            setTimeout(() => { messageDiv.style.display = 'none'; }, 3000);
-        } else {
-            throw new Error('提交失败');
-        }
-    } catch (error) {
-        messageDiv.innerHTML = '<div style="background:rgba(244,67,54,.2);border:1px solid rgba(244,67,54,.3);color:#f44336;padding:12px;border-radius:8px;text-align:center;">❌ 提交失败，请稍后重试</div>';
-        messageDiv.style.display = 'block';
-    } finally {
-        submitButton.disabled = false;
-        submitButton.textContent = '提交反馈';
-    }
-});
-setInterval(async () => {
-    try {
-        const r = await fetch('/api/status');
-        const d = await r.json();
-        document.getElementById('total-devices').textContent        = d.total_devices;
-        document.getElementById('online-count').textContent         = d.online;
-        document.getElementById('cpu-mem').innerHTML                = `CPU:${d.cpu}%<br>内存:${d.mem_used}/${d.mem_total}MB`;
-        document.getElementById('ping-ms').textContent              = d.ping_ms == null ? '--' : d.ping_ms.toFixed(1)+'ms';
-        document.getElementById('down-mbps').textContent            = d.down_mbps == null ? '--' : d.down_mbps.toFixed(1);
-        document.getElementById('up-mbps').textContent              = d.up_mbps == null ? '--' : d.up_mbps.toFixed(1);
-        const grid = document.getElementById('users-grid');
-        grid.innerHTML = d.users.map(u => `
-          <div class="user-card fade-in">
-            <div class="user-ip">📍 ${u.ip}</div>
-            <span class="user-status online">🟢 ${u.pt}</span>
-          </div>`).join('');
-    } catch(e){}
-}, 5000);
-setInterval(() => {
-    ['line_plot','user_pie','speed_chart'].forEach(n=>{
-        const img = document.querySelector(`img[alt*="${n.replace('_','')}"]`);
-        if(img) img.src = `/${n}.png?t=${Date.now()}`;
-    });
-}, 60000);
-</script>
-</body>
-</html>"""
-            return web.Response(text=response_html, content_type='text/html')
-
-        elif path == '/line_plot.png':
-            img = await generate_line_plot(); return web.Response(body=img, content_type='image/png')
-        elif path == '/user_pie.png':
-            img = await generate_user_pie(); return web.Response(body=img, content_type='image/png')
-        elif path == '/speed_chart.png':
-            img = await generate_speed_chart(); return web.Response(body=img, content_type='image/png')
-        elif path == '/speedtest_now':
-            # 取消手动测速，仅保留整点测速
-            return web.Response(text=json.dumps({'status': 'info', 'message': '测速已关闭，仅保留整点自动测速'}), content_type='application/json')
-        elif path == '/server':
-            snapshot = await scan_only(); return web.Response(text=html_snapshot(snapshot), content_type='text/html')
-        elif path == '/gg':
-            return web.Response(text="我是小贴士", content_type='text/html')      #小贴士内容
-        elif path == '/rs':
-            active_clients = await get_active_clients()
-            return web.Response(text= str(len(active_clients)) , content_type='text/html')
-        elif path == '/admin/admin':
-            items = list(clients.items()); req = "\n".join(f"<ul> {ip}: {data} </ul>" for ip, data in items)
-            return web.Response(text=f"<html><head><title>用户列表(ip)(管理员)</title></head><body><h1>用户列表(ip)</h1>{req}</body></html>", content_type='text/html')
-        elif path == '/heartbeat':
-            client_id = query_params.get('ip', ['unknown'])[0]
-            clients[client_id] = {'timestamp': time.time(), 'user': query_params.get('user', [''])[0], 'pwd': query_params.get('pwd', [''])[0], 'pt': query_params.get('pt', [''])[0]}
-            await add_client_id(client_id)
-            for k in list(response_cache.keys()):
-                if 'pie' in str(k) or 'homepage' in str(k): del response_cache[k]
-            return web.Response(text=f"<html><head><title>Heartbeat</title></head><body><h1>Heartbeat Received</h1><p>ip: {client_id}</p><p>user: {clients[client_id]['user']}</p><p>pwd: {clients[client_id]['pwd']}</p><p>%%{count_keys_with_specific_user(clients, clients[client_id]['user'])}%%</p></body></html>", content_type='text/html')
-        elif path == '/clients':
-            active_clients = await get_active_clients()
-            return web.Response(text=f"<html><head><title>用户列表(ip)</title></head><body><h1>用户列表(ip)</h1><ul>{''.join(f'<li>{ip}</li>' for ip in active_clients)}</ul></body></html>", content_type='text/html')
-        elif path == '/feedback' and request.method == 'POST':
+                    reader, writer = await asyncio.open_unix_connection(self.cluster.path(self.index, 'd'))
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline: raise
+                    await asyncio.sleep(0.05)
+            self.writer = writer
+            asyncio.ensure_future(self.read_replies(reader, writer))
+            return writer
+
+    async def read_replies(self, reader, writer):
+        try:
+            while True:
+                kind, seq, body = await read_frame(reader)
+                fut = self.waiting.pop(seq, None)
+                if kind == b'R' and fut is not None and not fut.done(): fut.set_result(body)
+        except (OSError, EOFError, asyncio.IncompleteReadError, ValueError, struct.error):
+            pass
+        finally:
+            self.lost(writer)
+
+    def lost(self, writer):
+        if self.writer is not writer: return
+        self.writer = None
+        writer.close()
+        for fut in self.waiting.values():
+            if not fut.done(): fut.set_exception(ConnectionError(f"进程{self.index}连接断开"))
+        self.waiting.clear()
+        self.cluster.forget_forwarded(self.index)
+
+    async def send(self, kind, body):
+        writer = await self.connect()
+        try:
+            writer.write(fwd_frame(kind, 0, body))
+            await writer.drain()
+        except OSError:
+            self.lost(writer); raise
+
+    async def request(self, body):
+        writer = await self.connect()
+        self.cluster.seq = seq = (self.cluster.seq + 1) & 0xFFFFFFFF
+        fut = self.waiting[seq] = asyncio.get_running_loop().create_future()
+        try:
+            writer.write(fwd_frame(b'H', seq, body))
+            await writer.drain()
+            return await fut
+        except OSError:
+            self.lost(writer); raise
+        finally:
+            self.waiting.pop(seq, None)
+
+class Cluster:
+    def __init__(self, index, size, shared, sockdir):
+        self.index, self.size = index, size
+        self.shared = shared        # [在线数 × size, 设备数 × size, 账号分布版本 × size, 在线人数记录版本]
+        self.sockdir = sockdir
+        self.peers = {}
+        self.seq = 0
+        self.forwarded = set()      # 已转发给属主进程的新设备 ip
+        self.pie_seen = 0
+        self.counts_seen = shared[3 * size] if shared is not None else 0
+
+    def path(self, i, kind):
+        return os.path.join(self.sockdir, f"{kind}{i}.sock")
+
+    def owner(self, key):
+        return zlib.crc32(key.encode('utf-8')) % self.size   # 不能用 hash()，各进程的字符串哈希种子不同
+
+    def owns(self, key):
+        return self.owner(key) == self.index
+
+    def peer(self, i):
+        p = self.peers.get(i)
+        if p is None: p = self.peers[i] = Peer(self, i)
+        return p
+
+    async def start(self):
+        self.peers = {i: Peer(self, i) for i in range(self.size) if i != self.index}
+        await asyncio.start_unix_server(self.serve, self.path(self.index, 'd'))   # 会先删除重启前留下的套接字文件
+        app = web.Application()
+        app.router.add_get('/internal/clients', handle_internal_clients)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.UnixSite(runner, self.path(self.index, 'h')).start()
+
+    async def serve(self, reader, writer):
+        """属主一侧：登记转发来的心跳、设备；应答写不出去时连接已断，发送方会按失败处理，这里不必重试"""
+        try:
+            while True:
+                kind, seq, body = await read_frame(reader)
+                if kind == b'H':
+                    writer.write(fwd_frame(b'R', seq, [register_heartbeat(*map(str, it)) for it in body]))
+                    await writer.drain()
+                elif kind == b'D':
+                    for ip in body: devices.add(ip)
+        except (OSError, EOFError, asyncio.IncompleteReadError, ValueError, TypeError, struct.error, asyncio.CancelledError):
+            pass    # 退出时连接任务被取消，不必当作错误打印
+        finally:
+            writer.close()
+
+    async def heartbeat(self, ip, user, pwd, pt):
+        """登记心跳并返回该账号在线设备数；账号不归本进程时转发给属主，属主不可达时抛出 OSError 或超时"""
+        return (await self.heartbeats([(ip, user, pwd, pt)]))[0]
+
+    async def heartbeats(self, entries):
+        """批量登记 (ip, user, pwd, pt)，返回各条对应账号的在线设备数；按属主分组，每个属主只转发一帧"""
+        self.add_devices(ip for ip, _, _, _ in entries)
+        groups = {}
+        for i, entry in enumerate(entries):
+            groups.setdefault(self.owner(entry[1]), []).append(i)
+        result = [0] * len(entries)
+        local = groups.pop(self.index, ())
+        for i in local: result[i] = register_heartbeat(*entries[i])
+        async def forward(owner, idx):
+            # 超时只放弃等待，不断开连接；属主稍后仍会登记，但不会在本进程重复登记
+            counts = await asyncio.wait_for(self.peer(owner).request([entries[i] for i in idx]), FORWARD_TIMEOUT)
+            for i, n in zip(idx, counts): result[i] = n
+        try:
+            await asyncio.gather(*(forward(owner, idx) for owner, idx in groups.items()))
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"[进程{self.index}] 转发心跳失败: {e!r}")
+            raise
+        return result
+
+    def add_devices(self, ips):
+        groups = {}
+        for ip in ips:
+            owner = self.owner(ip)
+            if owner == self.index: devices.add(ip)
+            elif ip not in self.forwarded:
+                self.forwarded.add(ip)
+                groups.setdefault(owner, []).append(ip)
+        for owner, batch in groups.items():
+            asyncio.ensure_future(self.send_devices(owner, batch))
+
+    async def send_devices(self, owner, batch):
+        try:
+            await self.peer(owner).send(b'D', batch)
+        except OSError:
+            self.forwarded.difference_update(batch)
+
+    def forget_forwarded(self, owner):
+        # 连接断开时缓冲中的设备可能没送到（对端也可能重启丢了未写入存储的 ip），之后再收到时重新转发
+        self.forwarded = {ip for ip in self.forwarded if self.owner(ip) != owner}
+
+    def publish(self):
+        """把本进程的在线数、设备数、账号分布版本写入共享内存"""
+        global pie_dirty
+        n = self.size
+        self.shared[self.index] = len(clients)
+        self.shared[n + self.index] = devices.total_devices
+        if pie_dirty:
+            pie_dirty = False; self.shared[2 * n + self.index] += 1
+
+    def online_total(self):
+        return sum(self.shared[:self.size])
+
+    def devices_total(self):
+        return sum(self.shared[self.size:2 * self.size])
+
+    def pie_changed(self):
+        gen = sum(self.shared[2 * self.size:3 * self.size])
+        if gen == self.pie_seen: return False
+        self.pie_seen = gen; return True
+
+    def counts_saved(self):
+        self.shared[3 * self.size] += 1
+        self.counts_seen = self.shared[3 * self.size]
+
+    def counts_changed(self):
+        gen = self.shared[3 * self.size]
+        if gen == self.counts_seen: return False
+        self.counts_seen = gen; return True
+
+    async def peer_clients(self):
+        """取其它进程的在线分片"""
+        async def fetch(i):
             try:
-                data = await request.post()
-                feedback_text = data.get('feedback', '').strip()
-                if feedback_text:
-                    await save_feedback(client_ip, feedback_text)
-                    return web.Response(text=json.dumps({'status': 'success', 'message': '反馈已提交'}), content_type='application/json')
-                return web.Response(text=json.dumps({'status': 'error', 'message': '反馈内容不能为空'}), content_type='application/json', status=400)
+                async with aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=self.path(i, 'h'))) as session:
+                    async with session.get('http://worker/internal/clients', timeout=aiohttp.ClientTimeout(total=FORWARD_TIMEOUT * 3)) as r:
+                        return {ip: ClientRecord(*v) for ip, v in (await r.json()).items()}
             except Exception as e:
-                print(f"处理反馈错误: {e}")
-                return web.Response(text=json.dumps({'status': 'error', 'message': '服务器错误'}), content_type='application/json', status=500)
-        else:
-            return web.Response(text=f"<html><head><title>404 Not Found</title></head><body><h1>404 Not Found</h1><p>The requested path {path} was not found.</p></body></html>", content_type='text/html', status=404)
+                print(f"[进程{self.index}] 读取进程{i}在线表失败: {e}")
+                return {}
+        return await asyncio.gather(*(fetch(i) for i in range(self.size) if i != self.index))
+
+async def handle_internal_clients(request):
+    return web.json_response({ip: [rec.timestamp, rec.user, rec.pwd, rec.pt] for ip, rec in get_active_clients().items()})
+
+def run_worker(index, size, shared, sockdir):
+    global cluster
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)   # 不继承主进程的处理函数，start_server 会装自己的
+    cluster = Cluster(index, size, shared, sockdir)
+    try:
+        asyncio.run(start_server())
+    except KeyboardInterrupt:
+        pass
+
+def run_workers(n):
+    # 主进程只负责看护：某个工作进程退出时记录并重新启动它，否则其分片的账号的心跳一直返回 503
+    ctx = multiprocessing.get_context('fork')
+    shared = ctx.Array('q', 3 * n + 1, lock=False)   # 每个槽位只由一个进程写
+    sockdir = tempfile.mkdtemp(prefix='drcom-')
+
+    def spawn(i):
+        p = ctx.Process(target=run_worker, args=(i, n, shared, sockdir), name=f"worker-{i}")
+        p.start(); return p
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # 主进程收到 SIGTERM 时与 Ctrl+C 一样：通知各工作进程退出并等它们写完新设备、会话快照
+    signal.signal(signal.SIGTERM, stop)
+    procs = [spawn(i) for i in range(n)]
+    try:
+        while True:
+            multiprocessing.connection.wait([p.sentinel for p in procs])
+            for i, p in enumerate(procs):
+                if p.exitcode is None: continue
+                print(f"[警告] 进程{i} (pid {p.pid}) 已退出，返回码 {p.exitcode}，{WORKER_RESTART_DELAY} 秒后重启")
+                shared[i] = shared[n + i] = 0   # 清掉它发布的在线数、设备数，重启后重新发布
+                time.sleep(WORKER_RESTART_DELAY)
+                procs[i] = spawn(i)
+    except KeyboardInterrupt:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)   # 等待期间再收到 SIGTERM 也要等工作进程收尾
+        for p in procs: p.terminate()
+        for p in procs: p.join()
+    finally:
+        shutil.rmtree(sockdir, ignore_errors=True)
+
+# ------------------ 路由 ------------------
+def log_request(request):
+    print(f"\033[94m[请求] {request.remote} - {request.path}\033[0m")
+
+def not_found_page(path):
+    return web.Response(text=f"<html><head><title>404 Not Found</title></head><body><h1>404 Not Found</h1><p>The requested path {path} was not found.</p></body></html>", content_type='text/html', status=404)
+
+@web.middleware
+async def error_middleware(request, handler):
+    try:
+        return await handler(request)
+    except web.HTTPException as e:
+        if e.status == 404:
+            log_request(request)
+            return not_found_page(request.path)
+        raise     # 405 等原样返回，已知路径用错方法时带上 Allow 头
     except Exception as e:
-        print(f"处理请求错误 {path}: {e}")
+        print(f"处理请求错误 {request.path}: {e}")
         return web.Response(text=f"<h1>500 Internal Server Error</h1><p>{str(e)}</p>", content_type='text/html', status=500)
 
-async def get_active_clients():
-    current_time = time.time()
-    return {ip: data for ip, data in clients.items() if current_time - data['timestamp'] < 60}
+def forward_failed():
+    # 多进程时账号的属主进程暂时不可达（重启中），让客户端稍后重试
+    return web.Response(text=json.dumps({'status': 'error', 'message': '服务暂不可用，请稍后重试'}, ensure_ascii=False),
+                        content_type='application/json', status=503)
+
+async def handle_heartbeat(request):
+    # 心跳热路径：不打印日志，只解析需要的参数
+    q = request.query
+    client_id = q.get('ip', 'unknown')
+    user, pwd = q.get('user', ''), q.get('pwd', '')
+    if cluster is None:
+        online = register_heartbeat(client_id, user, pwd, q.get('pt', ''))
+        devices.add(client_id)
+    else:
+        try:
+            online = await cluster.heartbeat(client_id, user, pwd, q.get('pt', ''))
+        except (OSError, asyncio.TimeoutError):
+            return forward_failed()
+    if q.get('v') == '2' or 'application/json' in request.headers.get('Accept', ''):
+        # 精简应答：在线人数 + 小贴士/版本哈希，哈希变化时客户端再去取 /gg、/update
+        return web.Response(text=f'{{"n":{online},"tip":"{TIP_HASH:08x}","ver":"{VER_HASH:08x}"}}', content_type='application/json')
+    return web.Response(text=f"<html><head><title>Heartbeat</title></head><body><h1>Heartbeat Received</h1><p>ip: {client_id}</p><p>user: {user}</p><p>pwd: {pwd}</p><p>%%{online}%%</p></body></html>", content_type='text/html')
+
+async def handle_heartbeat_batch(request):
+    # 宿舍网关等中继批量上报：body 为 [[ip, user, pt], ...] 的 JSON 数组，返回其中各账号的在线设备数
+    try:
+        items = await request.json()
+        if not isinstance(items, list) or len(items) > BATCH_MAX_ITEMS: raise ValueError
+        if not all(isinstance(it, list) and len(it) == 3 and all(isinstance(x, str) for x in it) for it in items): raise ValueError
+        entries = [tuple(it) for it in items]
+    except Exception:
+        return web.Response(text=json.dumps({'status': 'error', 'message': f'格式错误，应为不超过{BATCH_MAX_ITEMS}项的 [[ip, user, pt], ...]'}, ensure_ascii=False),
+                            content_type='application/json', status=400)
+    if cluster is None:
+        for ip, user, pt in entries:
+            register_heartbeat(ip, user, '', pt)
+            devices.add(ip)
+        users = {user: len(user_sessions.get(user, ())) for _, user, _ in entries}
+    else:
+        users = {}
+        try:
+            counts = await cluster.heartbeats([(ip, user, '', pt) for ip, user, pt in entries])
+        except (OSError, asyncio.TimeoutError):
+            return forward_failed()
+        for (_, user, _), n in zip(entries, counts):   # 同一批内在线数只增不减，取最大即为批末的值
+            users[user] = max(users.get(user, 0), n)
+    return web.Response(text=json.dumps({'users': users, 'tip': f"{TIP_HASH:08x}", 'ver': f"{VER_HASH:08x}"}, ensure_ascii=False), content_type='application/json')
+
+# ---- 前端轮询接口 ----
+async def handle_status(request):
+    return web.Response(text=json.dumps(await status_snapshot(), ensure_ascii=False), content_type='application/json')
+
+async def handle_events(request):
+    resp = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    await resp.prepare(request)
+    q = events.subscribe()
+    try:
+        await resp.write(sse_message('status', json.dumps(await status_snapshot(), ensure_ascii=False)))
+        while True:
+            try:
+                msg = await asyncio.wait_for(q.get(), timeout=SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                msg = b": keepalive\n\n"
+            await resp.write(msg)
+    except ConnectionResetError:
+        pass
+    finally:
+        events.unsubscribe(q)
+    return resp
+
+async def handle_index(request):
+    log_request(request)
+    page = homepage
+    headers = {'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    gz = 'gzip' in request.headers.get('Accept-Encoding', '')
+    headers['ETag'] = page['etag_gzip'] if gz else page['etag']
+    if headers['ETag'] in request.headers.get('If-None-Match', ''):
+        return web.Response(status=304, headers=headers)
+    if gz: headers['Content-Encoding'] = 'gzip'
+    return web.Response(body=page['gzip'] if gz else page['body'], content_type='text/html', charset='utf-8', headers=headers)
+
+async def handle_line_plot(request):
+    log_request(request)
+    range_name = request.query.get('range', 'all')
+    if range_name not in LINE_RANGES: range_name = 'all'
+    img = await generate_line_plot(range_name); return web.Response(body=img, content_type='image/png')
+
+async def handle_user_pie(request):
+    log_request(request)
+    img = await generate_user_pie(); return web.Response(body=img, content_type='image/png')
+
+async def handle_speed_chart(request):
+    log_request(request)
+    img = await generate_speed_chart(); return web.Response(body=img, content_type='image/png')
+
+async def handle_speedtest_now(request):
+    # 取消手动测速，仅保留整点测速
+    return web.Response(text=json.dumps({'status': 'info', 'message': '测速已关闭，仅保留整点自动测速'}), content_type='application/json')
+
+async def handle_server(request):
+    log_request(request)
+    snapshot = await scan_only(); return web.Response(text=html_snapshot(snapshot), content_type='text/html')
+
+async def handle_gg(request):
+    return web.Response(text=TIP_TEXT, content_type='text/html')
+
+async def handle_update(request):
+    return web.Response(text=LATEST_VER, content_type='text/html')
+
+async def handle_rs(request):
+    return web.Response(text= str(online_total()) , content_type='text/html')
+
+async def handle_admin(request):
+    log_request(request)
+    items = list((await all_clients()).items()); req = "\n".join(f"<ul> {ip}: {data} </ul>" for ip, data in items)
+    return web.Response(text=f"<html><head><title>用户列表(ip)(管理员)</title></head><body><h1>用户列表(ip)</h1>{req}</body></html>", content_type='text/html')
+
+async def handle_clients(request):
+    log_request(request)
+    active_clients = await all_clients()
+    return web.Response(text=f"<html><head><title>用户列表(ip)</title></head><body><h1>用户列表(ip)</h1><ul>{''.join(f'<li>{ip}</li>' for ip in active_clients)}</ul></body></html>", content_type='text/html')
+
+async def handle_feedback(request):
+    log_request(request)
+    try:
+        data = await request.post()
+        feedback_text = data.get('feedback', '').strip()
+        if feedback_text:
+            await save_feedback(request.remote, feedback_text)
+            return web.Response(text=json.dumps({'status': 'success', 'message': '反馈已提交'}), content_type='application/json')
+        return web.Response(text=json.dumps({'status': 'error', 'message': '反馈内容不能为空'}), content_type='application/json', status=400)
+    except Exception as e:
+        print(f"处理反馈错误: {e}")
+        return web.Response(text=json.dumps({'status': 'error', 'message': '服务器错误'}), content_type='application/json', status=500)
+
+def get_active_clients():
+    # 直接返回在线表本身（只读视图），调用方不要跨 await 持有
+    expire_clients()
+    return clients
+
+async def all_clients():
+    """全部在线客户端；多进程时汇总各进程的分片，返回新的 dict"""
+    active_clients = get_active_clients()
+    if cluster is None: return active_clients
+    merged = dict(active_clients)
+    for part in await cluster.peer_clients(): merged.update(part)
+    return merged
+
+def online_total():
+    return len(get_active_clients()) if cluster is None else cluster.online_total()
+
+ROUTES = [
+    ('*',   '/heartbeat',       handle_heartbeat),
+    ('POST', '/heartbeat/batch', handle_heartbeat_batch),
+    ('GET', '/',                handle_index),
+    ('GET', '/api/status',      handle_status),
+    ('GET', '/api/events',      handle_events),
+    ('GET', '/line_plot.png',   handle_line_plot),
+    ('GET', '/user_pie.png',    handle_user_pie),
+    ('GET', '/speed_chart.png', handle_speed_chart),
+    ('GET', '/speedtest_now',   handle_speedtest_now),
+    ('GET', '/server',          handle_server),
+    ('GET', '/gg',              handle_gg),
+    ('GET', '/update',          handle_update),
+    ('GET', '/rs',              handle_rs),
+    ('GET', '/admin/admin',     handle_admin),
+    ('GET', '/clients',         handle_clients),
+    ('POST', '/feedback',       handle_feedback),
+]
+
+def create_app():
+    app = web.Application(middlewares=[error_middleware])
+    for method, path, handler in ROUTES:
+        if method == 'GET': app.router.add_get(path, handler)   # add_get 同时注册 HEAD
+        else: app.router.add_route(method, path, handler)
+    return app
+
+async def load_history():
+    """在线人数、测速历史较大，端口监听后在线程中加载，完成前画图请求等待"""
+    global latest_speed
+    try:
+        await asyncio.to_thread(user_counts.load)
+        latest_speed = await asyncio.to_thread(load_speed_log, cluster is None or cluster.index == 0)
+    except Exception as e:
+        print(f"加载历史记录错误: {e}")
+    history_ready.set()
 
 async def start_server():
-    app = web.Application()
-    app.router.add_get('/{tail:.*}', handle)
-    app.router.add_post('/{tail:.*}', handle)
-    asyncio.create_task(cleanup_clients())
-    asyncio.create_task(save_user_count())
-    asyncio.create_task(speed_monitor_task())
+    # 先监听端口，心跳立即可用；存储在线程中打开（sqlite 首次使用要导入旧文件），历史记录、系统采样、图表进程随后在后台准备
+    # 多进程时每个进程都执行这里，整点记录、测速、图表进程预热只在 0 号进程做
+    app = create_app()
+    primary = cluster is None or cluster.index == 0
+    name = "" if cluster is None else f"[进程{cluster.index}] "
+    owns = None if cluster is None else cluster.owns
+    build_homepage()
+    if cluster is not None: await cluster.start()
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', web_port)
+    site = web.TCPSite(runner, '0.0.0.0', web_port, reuse_port=cluster is not None or None)
     await site.start()
-    print(f"服务器已启动 {web_port}端口")
+    print(f"{name}服务器已启动 {web_port}端口")
+    if udp_port:
+        await asyncio.get_running_loop().create_datagram_endpoint(HeartbeatProtocol, local_addr=('0.0.0.0', udp_port),
+                                                                  reuse_port=cluster is not None or None)
+        print(f"{name}UDP心跳已启动 {udp_port}端口")
+    await asyncio.to_thread(open_store)
+    devices.load(await asyncio.to_thread(store.load_devices), owns)
+    restored = restore_sessions(await asyncio.to_thread(store.load_sessions), owns)
+    if restored: print(f"{name}已恢复 {restored} 个在线会话")
+    asyncio.create_task(cleanup_clients())
+    asyncio.create_task(flush_devices())
+    asyncio.create_task(session_saver())
+    asyncio.create_task(load_history())
+    asyncio.create_task(metrics_sampler())
+    asyncio.create_task(neofetch_refresher())
+    asyncio.create_task(status_broadcaster())
+    if primary:
+        asyncio.create_task(warm_chart_pool())
+        asyncio.create_task(save_user_count())
+        asyncio.create_task(speed_monitor_task())
+    else:
+        asyncio.create_task(follow_speed_log())
 
-    while True:
-        await asyncio.sleep(3600)
+    # SIGTERM（systemd 停止服务、多进程时主进程 terminate）与 Ctrl+C 一样走到下面的收尾，写完新设备和会话快照再退出
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except (NotImplementedError, AttributeError):
+        pass    # Windows 不支持
+    try:
+        await stop.wait()
+        print(f"{name}收到退出信号，正在保存")
+    finally:
+        await devices.flush()
+        await save_sessions()
+        await asyncio.to_thread(store.close)
+        if chart_pool is not None: chart_pool.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
-    plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
-    plt.rcParams['axes.unicode_minus'] = False
-    plt.rcParams['figure.max_open_warning'] = 0
-    plt.switch_backend('Agg')
+    parser = argparse.ArgumentParser(description="网络认证助手服务端")
+    parser.add_argument('--port', type=int, default=web_port, help="web服务端口")
+    parser.add_argument('--udp-port', type=int, default=udp_port, help="UDP心跳端口，0为不开启")
+    parser.add_argument('--workers', type=int, default=workers, help="工作进程数，大于1时通过 SO_REUSEPORT 共用端口（仅 Linux）")
+    parser.add_argument('--storage', choices=['file', 'sqlite'], default=STORAGE, help="存储方式")
+    args = parser.parse_args()
+    web_port, udp_port, workers, STORAGE = args.port, args.udp_port, args.workers, args.storage
     if not os.path.exists('./librespeed-cli'):
         print("[警告] librespeed-cli 不存在，速度监控功能将不可用")
         print("请下载ARM64版本: https://github.com/librespeed/speedtest-cli/releases ")
     else:
         os.chmod('./librespeed-cli', 0o755)
-    asyncio.run(start_server())
+    if workers > 1: run_workers(workers)
+    else: asyncio.run(start_server())
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# 测速记录：定长二进制文件，每条记录 = 时间戳(epoch 秒, float64) + ping(ms) + 下载(Mbps) + 上传(Mbps)(float32)
+# 记录按时间顺序追加；查询时把文件内存映射，按时间二分查找窗口边界，只解码窗口内的记录
+# 导入旧的 csv 记录: python speedlog.py speedlog.csv speedlog.bin
+import csv
+import mmap
+import os
+import struct
+import sys
+import threading
+from datetime import datetime, timezone
+
+RECORD = struct.Struct('<dfff')
+TS = struct.Struct('<d')
+
+
+def parse_ts(text):
+    """librespeed 的 ISO 时间转 epoch 秒；不带时区的按 UTC 处理"""
+    dt = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def format_ts(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class SpeedLog:
+    def __init__(self, filename):
+        self.filename = filename
+        self._mm = None
+        self._size = 0
+        self._lock = threading.Lock()   # 服务端在线程中查询，重新映射时不能有其它线程在读
+
+    def append(self, ts, ping, down, up):
+        with open(self.filename, 'ab') as f:
+            f.write(RECORD.pack(ts, ping, down, up))
+
+    def extend(self, rows):
+        with open(self.filename, 'ab') as f:
+            f.write(b''.join(RECORD.pack(*row) for row in rows))
+
+    def _map(self):
+        try:
+            size = os.path.getsize(self.filename)
+        except OSError:
+            size = 0
+        size -= size % RECORD.size          # 忽略写了一半的尾部记录
+        if size != self._size:
+            if self._mm is not None: self._mm.close(); self._mm = None
+            if size:
+                with open(self.filename, 'rb') as f:
+                    self._mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self._size = size
+        return self._mm, size // RECORD.size
+
+    def __len__(self):
+        with self._lock:
+            return self._map()[1]
+
+    def _bisect(self, mm, n, ts):
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if TS.unpack_from(mm, mid * RECORD.size)[0] < ts: lo = mid + 1
+            else: hi = mid
+        return lo
+
+    def window(self, start, end=None):
+        """返回 [start, end) 时间窗口内的 (时间戳, ping, 下载, 上传) 四列"""
+        with self._lock:
+            mm, n = self._map()
+            if not n: return [], [], [], []
+            i = self._bisect(mm, n, start)
+            j = n if end is None else self._bisect(mm, n, end)
+            if i >= j: return [], [], [], []
+            data = mm[i * RECORD.size:j * RECORD.size]
+        return [list(col) for col in zip(*RECORD.iter_unpack(data))]
+
+    def last(self):
+        with self._lock:
+            mm, n = self._map()
+            return RECORD.unpack_from(mm, (n - 1) * RECORD.size) if n else None
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None: self._mm.close(); self._mm = None
+            self._size = 0
+
+
+def import_csv(csv_path, log):
+    """把旧的 speedlog.csv 导入二进制记录，按时间排序后追加，返回导入条数"""
+    rows = []
+    with open(csv_path, 'r', newline='') as f:
+        for row in csv.reader(f):             # 表头行解析失败会被跳过
+            if len(row) < 4: continue
+            try:
+                rows.append((parse_ts(row[0]), float(row[1]), float(row[2]), float(row[3])))
+            except ValueError:
+                continue
+    rows.sort()
+    last = log.last()
+    if last is not None: rows = [r for r in rows if r[0] > last[0]]
+    log.extend(rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("用法: python speedlog.py <speedlog.csv> <speedlog.bin>"); sys.exit(1)
+    print(f"已导入 {import_csv(sys.argv[1], SpeedLog(sys.argv[2]))} 条测速记录")
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# 服务端持久化：设备登记、每小时在线人数、测速记录、在线会话
+# FileStore 沿用原来的文件（count.yml、user_count_log.json、speedlog.bin），会话另存为 json 快照
+# SqliteStore 把它们放进一个 WAL 模式的 SQLite 库：每次写入的一批数据在一个事务里提交，
+#   在线人数、测速按时间建索引；首次打开空库时自动导入已有的文件数据
+# 两者接口相同，server.py 按 STORAGE 配置选择；方法都是同步的，由 server.py 放到线程中调用
+import glob
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from speedlog import SpeedLog
+
+
+def _parse_count(line):
+    o = json.loads(line)
+    return datetime.strptime(o['timestamp'], '%Y-%m-%d %H:%M:%S').timestamp(), int(o['user_count'])
+
+
+class FileStore:
+    def __init__(self, devices_file, counts_file, speed_file, sessions_file):
+        self.devices_file = devices_file
+        self.counts_file = counts_file
+        self.sessions_file = sessions_file
+        self.speed = SpeedLog(speed_file)
+
+    def open(self):
+        for name in (self.devices_file, self.counts_file, self.speed.filename):
+            if not os.path.exists(name): open(name, 'w').close()
+
+    def close(self):
+        self.speed.close()
+
+    # ---- 设备 ----
+    def load_devices(self):
+        try:
+            with open(self.devices_file, 'r', encoding='utf-8') as f:
+                return {ip for ip in f.read().strip().split(',') if ip}
+        except FileNotFoundError:
+            return set()
+
+    def add_devices(self, ips):
+        with open(self.devices_file, 'a', encoding='utf-8') as f:
+            f.write(''.join(f"{ip}," for ip in ips))
+
+    # ---- 在线人数 ----
+    def add_count(self, ts, count):
+        data = {"timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"), "user_count": count}
+        with open(self.counts_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+    def read_counts(self, cursor):
+        """从上次读到的字节位置继续读，返回 (是否需从头重建, [(时间戳, 人数)], 新位置)"""
+        offset, reset = cursor or 0, False
+        try:
+            size = os.path.getsize(self.counts_file)
+        except OSError:
+            return False, [], offset
+        if size < offset:     # 文件被截断或替换，从头读
+            offset, reset = 0, True
+        if size == offset: return reset, [], offset
+        with open(self.counts_file, 'rb') as f:
+            f.seek(offset); chunk = f.read(size - offset)
+        end = chunk.rfind(b'\n') + 1   # 只处理完整的行，写了一半的行留到下次
+        rows = []
+        for line in chunk[:end].splitlines():
+            if not line.strip(): continue
+            try:
+                rows.append(_parse_count(line))
+            except (ValueError, KeyError, TypeError):
+                continue
+        return reset, rows, offset + end
+
+    # ---- 在线会话 ----
+    def load_sessions(self):
+        rows = []
+        for name in glob.glob(glob.escape(self.sessions_file) + '.*'):
+            try:
+                with open(name, encoding='utf-8') as f:
+                    rows.extend(tuple(r) for r in json.load(f) if len(r) == 4)   # 旧版快照带密码，跳过
+            except (OSError, ValueError):
+                continue
+        return rows
+
+    def save_sessions(self, shard, rows):
+        """rows 为 (ip, 时间戳, 账号, 平台)，不含密码；先写临时文件再替换，避免留下半个快照"""
+        name = f"{self.sessions_file}.{shard}"
+        with open(name + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False)
+        os.replace(name + '.tmp', name)
+
+
+class SqliteSpeedLog:
+    """与 SpeedLog 相同接口的测速记录，存在 SqliteStore 的 speed 表里"""
+    def __init__(self, store):
+        self.store = store
+
+    def append(self, ts, ping, down, up):
+        self.extend([(ts, ping, down, up)])
+
+    def extend(self, rows):
+        with self.store.lock, self.store.db:
+            self.store.db.executemany("INSERT OR REPLACE INTO speed VALUES (?, ?, ?, ?)", rows)
+
+    def __len__(self):
+        with self.store.lock:
+            return self.store.db.execute("SELECT count(*) FROM speed").fetchone()[0]
+
+    def window(self, start, end=None):
+        """返回 [start, end) 时间窗口内的 (时间戳, ping, 下载, 上传) 四列"""
+        with self.store.lock:
+            rows = self.store.db.execute("SELECT ts, ping, down, up FROM speed WHERE ts >= ? AND ts < ? ORDER BY ts",
+                                         (start, float('inf') if end is None else end)).fetchall()
+        return [list(col) for col in zip(*rows)] if rows else [[], [], [], []]
+
+    def last(self):
+        with self.store.lock:
+            return self.store.db.execute("SELECT ts, ping, down, up FROM speed ORDER BY ts DESC LIMIT 1").fetchone()
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS devices (ip TEXT PRIMARY KEY) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS user_counts (ts REAL NOT NULL, count INTEGER NOT NULL);
+    CREATE INDEX IF NOT EXISTS user_counts_ts ON user_counts (ts);
+    CREATE TABLE IF NOT EXISTS speed (ts REAL PRIMARY KEY, ping REAL, down REAL, up REAL);
+    CREATE TABLE IF NOT EXISTS sessions (shard INTEGER NOT NULL, ip TEXT NOT NULL, ts REAL NOT NULL,
+                                         user TEXT, pt TEXT, PRIMARY KEY (shard, ip));
+    """
+
+    def __init__(self, filename, legacy=None):
+        self.filename = filename
+        self.legacy = legacy        # 首次打开时导入的旧数据 FileStore
+        self.lock = threading.Lock()
+        self.db = None
+        self.speed = SqliteSpeedLog(self)
+
+    def open(self):
+        # 多进程时每个进程各自打开；导入旧数据放在写事务里检查，只有第一个进程会执行
+        self.db = sqlite3.connect(self.filename, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        if 'pwd' in {col[1] for col in self.db.execute("PRAGMA table_info(sessions)")}:
+            self.db.execute("DROP TABLE sessions")    # 旧版会话表存了密码，会话只是快照，直接删掉重建
+        self.db.executescript(self.SCHEMA)
+        self.db.isolation_level = ''    # 之后按 with self.db: 自动开始/提交事务
+        if self.legacy is not None: self._import_legacy()
+
+    def _import_legacy(self):
+        with self.lock, self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            if self.db.execute("SELECT EXISTS (SELECT 1 FROM devices) OR EXISTS (SELECT 1 FROM user_counts)"
+                               " OR EXISTS (SELECT 1 FROM speed)").fetchone()[0]:
+                return
+            legacy = self.legacy
+            self.db.executemany("INSERT OR IGNORE INTO devices VALUES (?)", ((ip,) for ip in legacy.load_devices()))
+            self.db.executemany("INSERT INTO user_counts VALUES (?, ?)", legacy.read_counts(None)[1])
+            if len(legacy.speed):
+                self.db.executemany("INSERT OR REPLACE INTO speed VALUES (?, ?, ?, ?)", zip(*legacy.speed.window(0)))
+            legacy.close()
+
+    def close(self):
+        if self.db is not None: self.db.close(); self.db = None
+
+    # ---- 设备 ----
+    def load_devices(self):
+        with self.lock:
+            return {ip for (ip,) in self.db.execute("SELECT ip FROM devices")}
+
+    def add_devices(self, ips):
+        with self.lock, self.db:
+            self.db.executemany("INSERT OR IGNORE INTO devices VALUES (?)", ((ip,) for ip in ips))
+
+    # ---- 在线人数 ----
+    def add_count(self, ts, count):
+        with self.lock, self.db:
+            self.db.execute("INSERT INTO user_counts VALUES (?, ?)", (ts, count))
+
+    def read_counts(self, cursor):
+        """按 rowid 读取上次之后新增的记录，返回值同 FileStore.read_counts"""
+        with self.lock:
+            rows = self.db.execute("SELECT rowid, ts, count FROM user_counts WHERE rowid > ? ORDER BY rowid",
+                                   (cursor or 0,)).fetchall()
+        if not rows: return False, [], cursor or 0
+        return False, [(ts, count) for _, ts, count in rows], rows[-1][0]
+
+    # ---- 在线会话 ----
+    def load_sessions(self):
+        with self.lock:
+            return self.db.execute("SELECT ip, ts, user, pt FROM sessions ORDER BY ts").fetchall()
+
+    def save_sessions(self, shard, rows):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM sessions WHERE shard = ?", (shard,))
+            self.db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                                ((shard, *row) for row in rows))